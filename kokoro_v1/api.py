@@ -1,193 +1,257 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-import boto3
+from typing import Literal, Optional
 import os
-import uuid
-from datetime import datetime, timedelta
-import subprocess
-import sys
-from pathlib import Path
-from moviepy.editor import VideoFileClip
 import json
+import base64
+import asyncio
+import threading
+
+from app import (normalize_voice, stream_segments, SAMPLE_RATE, pipeline_pool, get_audio_cache, get_segment_cache,
+                 get_g2p_cache, G2P_CACHE_SIZE, warm_up, is_ready, batch_stats)
+from orchestrator import JobContext, VIDEO_STAGES, run_stages, background_cache
+from jobs import JobQueue, QueueFull
+from uploader import VideoUploader
+from translation import get_translator
+from metrics import register_stats, render_latest
+from scripts.subtitle_renderer import cache_stats as caption_cache_stats
 
 app = FastAPI()
 
 # AWS Configuration
-s3_client = boto3.client('s3', region_name='us-east-1')
-dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
 BUCKET_NAME = "wsobucket1"  # Your S3 bucket name
 TABLE_NAME = "wso_metadata"  # Replace with your table name
+uploader = VideoUploader(BUCKET_NAME, TABLE_NAME)
+
+# Video jobs run in the background, at most this many at a time
+MAX_CONCURRENT_JOBS = int(os.environ.get("KOKORO_MAX_CONCURRENT_JOBS", 2))
+MAX_QUEUED_JOBS = int(os.environ.get("KOKORO_MAX_QUEUED_JOBS", 100))
+JOB_EVENTS_POLL_INTERVAL = 0.5  # seconds
+job_queue = JobQueue(max_workers=MAX_CONCURRENT_JOBS, max_queued=MAX_QUEUED_JOBS)
+
+# Cache hit ratios and queue gauges are read from the components on every scrape
+register_stats({
+    'pipelines': pipeline_pool.stats,
+    'audio_cache': lambda: get_audio_cache().stats(),
+    'segment_cache': lambda: get_segment_cache().stats(),
+    'caption_cache': caption_cache_stats,
+    'translation': lambda: get_translator().stats(),
+    **({'g2p': lambda: get_g2p_cache().stats()} if G2P_CACHE_SIZE > 0 else {}),
+}, jobs=job_queue.stats)
+
+# Load the model and run a dummy synthesis when the server starts (set to 0 to load it on the first request)
+WARM_UP = os.environ.get("KOKORO_WARM_UP", "1") != "0"
+
+@app.on_event("startup")
+def start_warm_up():
+    """Warm up in the background so the server is up (and answers /ready) right away."""
+    if WARM_UP:
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    background_cache.refresh_async()  # New backgrounds are normalized off the render path
+
+@app.get("/ready")
+def ready():
+    """Readiness probe: 200 once the warm-up synthesis has finished, 503 before."""
+    if not is_ready():
+        raise HTTPException(status_code=503, detail="Warming up")
+    return {'ready': True}
 
 class VideoRequest(BaseModel):
     title: str
     content: str
+    voice: str = "af_bella"  # A stock voice or a mix such as "af_bella:0.7,af_heart:0.3"
+    render_backend: Literal["moviepy", "ffmpeg"] = "moviepy"  # "ffmpeg" burns subtitles without a Python frame loop
+
+class TTSRequest(BaseModel):
+    text: str
+    language: str = "American English"
+    voice: str = "af_bella"  # A stock voice or a mix such as "af_bella:0.7,af_heart:0.3"
+    speed: float = 1.0
+    format: str = "pcm"  # "pcm" for raw audio, "ndjson" for audio plus word timestamps
+    backend: Optional[Literal["torch", "torch-int8", "onnx", "onnx-int8"]] = None  # None uses KOKORO_BACKEND
 
-def get_video_duration(video_path):
-    """Get the duration of a video file in seconds."""
+def check_voice(voice):
+    """Rejects malformed voice mix specs before any work starts."""
     try:
-        with VideoFileClip(video_path) as video:
-            return video.duration
-    except Exception as e:
-        print(f"Error getting video duration: {e}")
-        return None
-
-def run_script(script_name, check_files=None):
-    """Run a Python script and wait for it to complete."""
-    print(f"\n{'='*50}")
-    print(f"Running {script_name}...")
-    print(f"{'='*50}\n")
-    
-    # Get the script path
-    script_path = os.path.join(os.path.dirname(__file__), 'scripts', script_name)
-    
-    # Run the script
-    process = subprocess.Popen([sys.executable, script_path], 
-                             stdout=subprocess.PIPE, 
-                             stderr=subprocess.PIPE,
-                             universal_newlines=True)
-    
-    # Print output in real-time
-    while True:
-        output = process.stdout.readline()
-        if output == '' and process.poll() is not None:
-            break
-        if output:
-            print(output.strip())
-    
-    # Get return code
-    return_code = process.poll()
-    
-    if return_code != 0:
-        print(f"Error: {script_name} failed with return code {return_code}")
-        return False
-    
-    # If check_files is provided, verify the files exist
-    if check_files:
-        kokoro_dir = os.path.dirname(os.path.abspath(__file__))
-        for file_pattern in check_files:
-            # Get the most recent file matching the pattern
-            if file_pattern.startswith("word_level_") or file_pattern.endswith(".wav"):
-                search_dir = os.path.join(kokoro_dir, "last")
-            elif file_pattern.endswith(".mp4"):
-                search_dir = os.path.join(kokoro_dir, "final_videos")
-            else:
-                search_dir = kokoro_dir
-            
-            files = list(Path(search_dir).glob(file_pattern))
-            if not files:
-                print(f"Error: No files found matching {file_pattern}")
-                return False
-            
-            # Sort by modification time (newest first)
-            latest_file = max(files, key=lambda x: x.stat().st_mtime)
-            print(f"Found {latest_file}")
-            
-            # Return the latest file path if needed
-            if file_pattern.endswith(".mp4"):
-                return str(latest_file)
-    
-    return True
-
-def generate_presigned_url(bucket, key, expiration=3600):
-    """Generate a presigned URL for an S3 object."""
+        normalize_voice(voice)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def segment_event(segment):
+    """JSON-safe description of a streamed segment (everything but the audio)."""
+    return {
+        'event': 'segment',
+        'index': segment['index'],
+        'text': segment['text'],
+        'start': segment['start'],
+        'duration': segment['duration'],
+        'words': segment['words']
+    }
+
+@app.post("/tts/stream")
+def tts_stream(request: TTSRequest):
+    """Stream synthesized speech segment by segment as chunked HTTP.
+
+    format=pcm sends raw 16-bit mono PCM at SAMPLE_RATE, format=ndjson sends one
+    JSON line per segment with base64 audio and its word timestamps.
+    """
+    if request.format not in ("pcm", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'pcm' or 'ndjson'")
+    check_voice(request.voice)
+    segments = stream_segments(request.text, Language=request.language, voice=request.voice, speed=request.speed,
+                               backend=request.backend)
+
+    if request.format == "pcm":
+        def pcm_chunks():
+            for segment in segments:
+                yield segment['audio'].tobytes()
+        return StreamingResponse(pcm_chunks(), media_type="audio/pcm", headers={
+            'X-Sample-Rate': str(SAMPLE_RATE),
+            'X-Sample-Format': 's16le',
+            'X-Channels': '1'
+        })
+
+    def ndjson_lines():
+        for segment in segments:
+            event = segment_event(segment)
+            event['audio'] = base64.b64encode(segment['audio'].tobytes()).decode('ascii')
+            yield json.dumps(event) + "\n"
+        yield json.dumps({'event': 'end', 'sample_rate': SAMPLE_RATE}) + "\n"
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+@app.websocket("/tts/ws")
+async def tts_websocket(websocket: WebSocket):
+    """Stream synthesized speech over a WebSocket.
+
+    The client sends one TTSRequest as JSON. For each segment the server sends a
+    JSON text frame with the timestamps followed by a binary frame with the PCM.
+    """
+    await websocket.accept()
     try:
-        response = s3_client.generate_presigned_url(
-            'get_object',
-            Params={'Bucket': bucket, 'Key': key},
-            ExpiresIn=expiration
-        )
-        return response
+        request = TTSRequest(**await websocket.receive_json())
+        segments = stream_segments(request.text, Language=request.language, voice=request.voice, speed=request.speed,
+                                   backend=request.backend)
+        while True:
+            # Synthesis is blocking, keep it off the event loop
+            segment = await run_in_threadpool(next, segments, None)
+            if segment is None:
+                break
+            await websocket.send_json(segment_event(segment))
+            await websocket.send_bytes(segment['audio'].tobytes())
+        await websocket.send_json({'event': 'end', 'sample_rate': SAMPLE_RATE})
+        await websocket.close()
+    except WebSocketDisconnect:
+        print("TTS websocket client disconnected")
     except Exception as e:
-        print(f"Error generating presigned URL: {e}")
-        return None
+        await websocket.send_json({'event': 'error', 'detail': str(e)})
+        await websocket.close(code=1011)
+
+def upload_stage(ctx):
+    """Wait for the uploads started during render and split, then record the job in DynamoDB."""
+    full_video_url, metadata = ctx.artifacts['uploads'].finish(ctx.title, ctx.content, ctx.artifacts['duration'])
+    ctx.artifacts['full_video_url'] = full_video_url
+    ctx.artifacts['metadata'] = metadata
+
+JOB_STAGES = VIDEO_STAGES + [("upload", upload_stage)]
+
+def run_video_job(job, request):
+    """Run every stage of a video job, reporting stage progress on the job."""
+    def on_stage(ctx, stage, status):
+        job_queue.update_stage(job, stage, status, ctx.timings.get(stage))
 
-@app.post("/generate-video")
-async def generate_video(request: VideoRequest):
+    ctx = JobContext(request.title, request.content, request_id=job.id, voice=request.voice,
+                     render_backend=request.render_backend)
+    # Outputs start uploading as soon as they are written, overlapping the stages that follow
+    uploads = uploader.session(ctx.request_id)
+    ctx.artifacts['uploads'] = uploads
+    ctx.on_output = uploads.add
+    # TTS -> subtitles -> render -> split -> upload, all in this process
     try:
-        # Generate a unique ID for this request
-        request_id = str(uuid.uuid4())
-        
-        # Save the request data to a JSON file
-        json_path = os.path.join(os.path.dirname(__file__), 'wso_content.json')
-        with open(json_path, 'w') as f:
-            json.dump({
-                'title': request.title,
-                'content': request.content
-            }, f)
-        
-        # Step 1: Run format_json.py (already done by saving the JSON)
-        
-        # Step 2: Run auto_tts.py
-        if not run_script("auto_tts.py", check_files=[
-            "word_level_*.srt",
-            "*.wav"
-        ]):
-            raise HTTPException(status_code=500, detail="TTS generation failed")
-        
-        # Step 3: Run create_final_video.py
-        final_video_path = run_script("create_final_video.py", check_files=[
-            "final_video_*.mp4"
-        ])
-        if not final_video_path:
-            raise HTTPException(status_code=500, detail="Video creation failed")
-        
-        # Check video duration
-        duration = get_video_duration(final_video_path)
-        if duration is None:
-            raise HTTPException(status_code=500, detail="Could not determine video duration")
-        
-        # Upload the full video to S3
-        full_video_key = f"videos/{request_id}/full_video.mp4"
-        s3_client.upload_file(final_video_path, BUCKET_NAME, full_video_key)
-        
-        # Generate presigned URL for full video
-        full_video_url = generate_presigned_url(BUCKET_NAME, full_video_key)
-        
-        # Store metadata in DynamoDB
-        table = dynamodb.Table(TABLE_NAME)
-        metadata = {
-            'request_id': request_id,
-            'title': request.title,
-            'content': request.content,
-            'duration': str(duration),  # Convert float to string for DynamoDB
-            'created_at': datetime.utcnow().isoformat(),
-            'full_video_key': full_video_key,
-            'parts': []
-        }
-        
-        # If video is longer than 120 seconds, split it
-        if duration > 120:
-            if not run_script("split_video.py", check_files=[
-                "final_video_*_part*.mp4"
-            ]):
-                raise HTTPException(status_code=500, detail="Video splitting failed")
-            
-            # Upload split parts to S3 and generate presigned URLs
-            parts = []
-            for part_file in Path(os.path.dirname(final_video_path)).glob("final_video_*_part*.mp4"):
-                part_key = f"videos/{request_id}/parts/{part_file.name}"
-                s3_client.upload_file(str(part_file), BUCKET_NAME, part_key)
-                part_url = generate_presigned_url(BUCKET_NAME, part_key)
-                parts.append({
-                    'key': part_key,
-                    'url': part_url
-                })
-            
-            metadata['parts'] = parts
-        
-        # Save metadata to DynamoDB
-        table.put_item(Item=metadata)
-        
-        # Return the response
-        return {
-            'request_id': request_id,
-            'duration': duration,
-            'full_video_url': full_video_url,
-            'parts': metadata['parts'] if duration > 120 else []
-        }
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        run_stages(ctx, JOB_STAGES, on_stage=on_stage)
+    finally:
+        # Uploads may still be reading from the workspace when an earlier stage failed
+        uploads.wait()
+        ctx.workspace.cleanup()
+    return {
+        'request_id': ctx.request_id,
+        'duration': ctx.artifacts['duration'],
+        'full_video_url': ctx.artifacts['full_video_url'],
+        'parts': ctx.artifacts['metadata']['parts']
+    }
+
+@app.post("/generate-video", status_code=202)
+def generate_video(request: VideoRequest):
+    """Queue a video job and return its id right away."""
+    check_voice(request.voice)
+    try:
+        job = job_queue.submit(lambda job: run_video_job(job, request),
+                               stage_names=[name for name, _ in JOB_STAGES])
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': f"/jobs/{job.id}",
+        'events_url': f"/jobs/{job.id}/events"
+    }
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """Current status, per-stage progress and, once done, the result of a job."""
+    found = job_queue.get(job_id)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return found[1]
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-sent events with the job status every time it changes, until it finishes."""
+    if job_queue.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        last_version = None
+        idle = 0.0
+        while True:
+            found = job_queue.get(job_id)
+            if found is None:
+                break
+            version, job = found
+            if version != last_version:
+                last_version = version
+                idle = 0.0
+                yield f"event: status\ndata: {json.dumps(job)}\n\n"
+                if job['status'] in ("done", "failed"):
+                    break
+            elif idle >= 15:
+                idle = 0.0
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(JOB_EVENTS_POLL_INTERVAL)
+            idle += JOB_EVENTS_POLL_INTERVAL
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={'Cache-Control': 'no-cache'})
+
+@app.get("/stats")
+def stats():
+    """Pipeline pool, audio/segment/caption/translation/G2P cache, model batching and job queue counters."""
+    return {
+        'pipelines': pipeline_pool.stats(),
+        'audio_cache': get_audio_cache().stats(),
+        'segment_cache': get_segment_cache().stats(),
+        'caption_cache': caption_cache_stats(),
+        'translation': get_translator().stats(),
+        'g2p': get_g2p_cache().stats() if G2P_CACHE_SIZE > 0 else None,
+        'batching': batch_stats(),
+        'jobs': job_queue.stats()
+    }
+
+@app.get("/metrics")
+def metrics():
+    """Stage latency histograms, cache hit ratios and job queue gauges in the Prometheus text format."""
+    body, content_type = render_latest()
+    return Response(content=body, media_type=content_type)
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,17 +1,28 @@
 # Initalize a pipeline
-from kokoro import KPipeline
+from pipeline_pool import PipelinePool, segment_from_result, phonemize, infer_chunk, finish_chunk
+from tts_cache import DiskCache, cache_key, save_segment, load_segment
+from metrics import timed, timed_function
+from inference_backends import INFERENCE_BACKEND, INFERENCE_THREADS, load_backend
+from mmap_store import MMAP_ENABLED, voice_store
+from voice_mix import blend, is_mix, normalize_voice
+from g2p_cache import G2PCache
 # from IPython.display import display, Audio
 # import soundfile as sf
+# gradio, huggingface_hub, kokoro and torch are only imported when first needed
 import os
-from huggingface_hub import list_repo_files
+import sys
 import uuid
 import re 
-import gradio as gr
+import threading
+import time
+from collections import deque
 
 
 #translate langauge 
-from deep_translator import GoogleTranslator
+from translation import get_translator
+@timed_function("translate")
 def bulk_translate(text, target_language, chunk_size=500):
+    """Translates text into target_language, chunks in parallel and cached per sentence (see translation.py)."""
     language_map_local = {
     "American English": "en",  
     "British English": "en",  
@@ -25,23 +36,7 @@ def bulk_translate(text, target_language, chunk_size=500):
     }
     # lang_code = GoogleTranslator().get_supported_languages(as_dict=True).get(target_language.lower())
     lang_code=language_map_local[target_language]
-    sentences = re.split(r'(?<=[.!?])\s+', text)  # Split text into sentences
-    chunks = []
-    current_chunk = ""
-
-    for sentence in sentences:
-        if len(current_chunk) + len(sentence) <= chunk_size:
-            current_chunk += " " + sentence
-        else:
-            chunks.append(current_chunk.strip())
-            current_chunk = sentence
-
-    if current_chunk:
-        chunks.append(current_chunk.strip())
-
-    translated_chunks = [GoogleTranslator(target=lang_code).translate(chunk) for chunk in chunks]
-    result=" ".join(translated_chunks)
-    return result.strip()
+    return get_translator().translate(text, lang_code, chunk_size=chunk_size)
     
 # Language mapping dictionary
 language_map = {
@@ -57,30 +52,110 @@ language_map = {
 }
 
 
+# Pipelines are pooled per language code and share one model
+MAX_PIPELINES = int(os.environ.get("KOKORO_MAX_PIPELINES", 3))
+# With KOKORO_BATCH_WINDOW_MS > 0, chunks from concurrent requests are collected for that long and
+# synthesized together in padded batches of up to KOKORO_BATCH_MAX_SIZE
+BATCH_WINDOW_MS = float(os.environ.get("KOKORO_BATCH_WINDOW_MS", 0))
+BATCH_MAX_SIZE = int(os.environ.get("KOKORO_BATCH_MAX_SIZE", 8))
+batching_model = None
+
+def build_model():
+    """The pool's shared model: the KOKORO_BACKEND backend, batched when KOKORO_BATCH_WINDOW_MS is set."""
+    global batching_model
+    model = load_backend(INFERENCE_BACKEND, pipeline_pool.repo_id, INFERENCE_THREADS)
+    if BATCH_WINDOW_MS > 0:
+        if INFERENCE_BACKEND.startswith("onnx"):
+            print(f"Batching needs a torch backend, running {INFERENCE_BACKEND} unbatched")
+        else:
+            from batching import BatchingModel
+            batching_model = model = BatchingModel(model, window=BATCH_WINDOW_MS / 1000, max_batch=BATCH_MAX_SIZE)
+    return model
+
+def batch_stats():
+    """Batch counters of the shared model, or None when batching is off or the model isn't loaded yet."""
+    return batching_model.stats() if batching_model else None
+
+# Phonemes of recently seen sentences and words, shared by all pipelines; KOKORO_G2P_CACHE_SIZE=0 turns it off
+G2P_CACHE_SIZE = int(os.environ.get("KOKORO_G2P_CACHE_SIZE", 20000))
+G2P_CACHE_PATH = os.environ.get("KOKORO_G2P_CACHE_PATH") or None  # Saved there at exit and loaded on start
+g2p_cache = None
+# The caches below are built (loaded, scanned) on first use, so importing this module does no disk work
+caches_lock = threading.Lock()
+
+def get_g2p_cache():
+    """The shared G2P cache, loaded on first use; None when KOKORO_G2P_CACHE_SIZE is 0."""
+    global g2p_cache
+    if G2P_CACHE_SIZE <= 0:
+        return None
+    with caches_lock:
+        if g2p_cache is None:
+            g2p_cache = G2PCache(G2P_CACHE_SIZE, G2P_CACHE_PATH)
+    return g2p_cache
+
+pipeline_pool = PipelinePool(max_size=MAX_PIPELINES, model_factory=build_model, g2p_cache_factory=get_g2p_cache)
+
+def prepare_voice(pipeline, voice):
+    """Returns the voice name to synthesize with, registering the blended pack of a mix spec on the pipeline."""
+    voice = normalize_voice(voice)
+    if is_mix(voice) and voice not in pipeline.voices:
+        pipeline.voices[voice] = blend(voice, pipeline.load_voice, pipeline_pool.repo_id)
+    return voice
+
+# Models of backends other than KOKORO_BACKEND, loaded when a request asks for one
+backend_models = {}
+backend_models_lock = threading.Lock()
+
+def get_backend_model(backend=None):
+    """The model for an inference backend; None means the pool's shared KOKORO_BACKEND model."""
+    if backend is None or backend == INFERENCE_BACKEND:
+        return pipeline_pool.get_model()
+    with backend_models_lock:
+        if backend not in backend_models:
+            backend_models[backend] = load_backend(backend, pipeline_pool.repo_id, INFERENCE_THREADS)
+        return backend_models[backend]
+
 def update_pipeline(Language):
-    """ Updates the pipeline only if the language has changed. """
-    global pipeline, last_used_language
+    """ Returns the pooled pipeline for the language, falling back to English if it can't be built. """
     # Get language code, default to 'a' if not found
     new_lang = language_map.get(Language, "a")
-
-    # Only update if the language is different
-    if new_lang != last_used_language:
-        pipeline = KPipeline(lang_code=new_lang)
-        last_used_language = new_lang 
-        try:
-            pipeline = KPipeline(lang_code=new_lang)
-            last_used_language = new_lang  # Update last used language
-        except Exception as e:
+    try:
+        return pipeline_pool.get(new_lang)
+    except Exception as e:
+        print(f"Could not build the {Language} pipeline ({e}), falling back to English")
+        if "gradio" in sys.modules:  # Only the UI shows these
+            gr = sys.modules["gradio"]
             gr.Warning(f"Make sure the input text is in {Language}",duration=10)
             gr.Warning(f"Fallback to English Language",duration=5)
-            pipeline = KPipeline(lang_code="a")  # Fallback to English
-            last_used_language = "a"
+        return pipeline_pool.get("a")  # Fallback to English
 
 
 
-def get_voice_names(repo_id):
-    """Fetches and returns a list of voice names (without extensions) from the given Hugging Face repository."""
-    return [os.path.splitext(file.replace("voices/", ""))[0] for file in list_repo_files(repo_id) if file.startswith("voices/")]
+VOICES_MANIFEST = os.environ.get("KOKORO_VOICES_MANIFEST", os.path.join(os.path.dirname(os.path.abspath(__file__)), "voices.json"))
+
+def get_voice_names(repo_id, refresh=False):
+    """Returns the voice names (without extensions) of the given Hugging Face repository.
+
+    The list is read from the local VOICES_MANIFEST; the repository is only
+    listed over the network when the manifest is missing or refresh is set.
+    """
+    if not refresh:
+        try:
+            with open(VOICES_MANIFEST, encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("repo_id") == repo_id:
+                return manifest["voices"]
+        except (OSError, ValueError, KeyError):
+            pass
+    from huggingface_hub import list_repo_files
+    try:
+        voices = [os.path.splitext(file.replace("voices/", ""))[0] for file in list_repo_files(repo_id) if file.startswith("voices/")]
+    except Exception as e:
+        print(f"Could not list the voices of {repo_id}: {e}")
+        return ["af_heart"]
+    with open(VOICES_MANIFEST, "w", encoding="utf-8") as f:
+        json.dump({"repo_id": repo_id, "voices": voices}, f, indent=2)
+    return voices
 
 def create_audio_dir():
     """Creates the 'kokoro_audio' directory in the kokoro_v1 folder if it doesn't exist."""
@@ -96,6 +171,7 @@ def create_audio_dir():
 
 import re
 
+@timed_function("clean_text")
 def clean_text(text):
     # Define replacement rules
     replacements = {
@@ -132,8 +208,29 @@ def clean_text(text):
 
     return text
 
-def tts_file_name(text,language):
+def split_units(text):
+    """Splits raw text into the sentences that are phonemized and synthesized one at a time.
+
+    Must run before clean_text, which folds line breaks into spaces; breaks and
+    sentence ends both end a unit.
+    """
+    units = []
+    for paragraph in re.split(r'\n+', text):
+        for sentence in re.split(r'(?<=[.!?।])\s+|(?<=[。！？])', paragraph):
+            if sentence.strip():
+                units.append(sentence)
+    return units
+
+temp_folder = None
+
+def get_temp_folder():
+    """Directory for the files KOKORO_TTS_API hands out, created on first use."""
     global temp_folder
+    if temp_folder is None:
+        temp_folder = create_audio_dir()
+    return temp_folder
+
+def tts_file_name(text,language):
     # Remove all non-alphabetic characters and convert to lowercase
     text = re.sub(r'[^a-zA-Z\s]', '', text)  # Retain only alphabets and spaces
     text = text.lower().strip()             # Convert to lowercase and strip leading/trailing spaces
@@ -146,95 +243,230 @@ def tts_file_name(text,language):
     random_string = uuid.uuid4().hex[:8].upper()
     
     # Construct the file name
-    file_name = f"{temp_folder}/{truncated_text}_{random_string}.wav"
+    file_name = f"{get_temp_folder()}/{truncated_text}_{random_string}.wav"
     return file_name
 
 
 # import soundfile as sf
 import numpy as np
 import wave
-from pydub import AudioSegment
-from pydub.silence import split_on_silence
+from silence import SilenceTrimmer, trim_silence
 
 def remove_silence_function(file_path,minimum_silence=50):
-    # Extract file name and format from the provided path
+    """Writes a copy of the WAV file with long silences collapsed to minimum_silence ms."""
     output_path = file_path.replace(".wav", "_no_silence.wav")
-    audio_format = "wav"
-    # Reading and splitting the audio file into chunks
-    sound = AudioSegment.from_file(file_path, format=audio_format)
-    audio_chunks = split_on_silence(sound,
-                                    min_silence_len=100,
-                                    silence_thresh=-45,
-                                    keep_silence=minimum_silence) 
-    # Putting the file back together
-    combined = AudioSegment.empty()
-    for chunk in audio_chunks:
-        combined += chunk
-    combined.export(output_path, format=audio_format)
+    write_wav(output_path, trim_silence(read_wav(file_path), sample_rate=SAMPLE_RATE, keep_silence=minimum_silence))
     return output_path
-def generate_and_save_audio(text, Language="American English",voice="af_bella", speed=1,remove_silence=False,keep_silence_up_to=0.05):
-    text=clean_text(text)
-    update_pipeline(Language)
-    generator = pipeline(text, voice=voice, speed=speed, split_pattern=r'\n+')
-    save_path=tts_file_name(text,Language)
-    # Open the WAV file for writing
+SAMPLE_RATE = 24000
+
+# Synthesized segments are memoized on disk so edited articles only re-synthesize what changed
+SEGMENT_CACHE_DIR = os.environ.get("KOKORO_SEGMENT_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "segment_cache"))
+SEGMENT_CACHE_MAX_BYTES = int(float(os.environ.get("KOKORO_SEGMENT_CACHE_MAX_MB", 1024)) * 1024 * 1024)
+segment_cache = None
+
+def get_segment_cache():
+    """The segment cache, scanned on first use."""
+    global segment_cache
+    with caches_lock:
+        if segment_cache is None:
+            segment_cache = DiskCache(SEGMENT_CACHE_DIR, SEGMENT_CACHE_MAX_BYTES)
+    return segment_cache
+
+# With KOKORO_TTS_WORKERS > 1, chunks are synthesized in parallel by that many worker processes
+TTS_WORKERS = int(os.environ.get("KOKORO_TTS_WORKERS", 0))
+# Chunks queued on the worker pool ahead of the one being streamed (default: two per worker)
+TTS_LOOKAHEAD = int(os.environ.get("KOKORO_TTS_LOOKAHEAD", 0)) or 2 * TTS_WORKERS
+parallel_synthesizer = None
+parallel_synthesizer_lock = threading.Lock()
+
+def get_parallel_synthesizer():
+    """Returns the shared worker pool, or None when synthesis runs in this process."""
+    global parallel_synthesizer
+    if TTS_WORKERS <= 1:
+        return None
+    with parallel_synthesizer_lock:
+        if parallel_synthesizer is None:
+            from parallel_tts import ParallelSynthesizer
+            parallel_synthesizer = ParallelSynthesizer(TTS_WORKERS, repo_id=pipeline_pool.repo_id,
+                                                        threads_per_worker=INFERENCE_THREADS, backend=INFERENCE_BACKEND)
+    return parallel_synthesizer
+
+def lookahead(items, size):
+    """Yields items in order, evaluating up to size of them ahead of the one yielded."""
+    window = deque()
+    for item in items:
+        window.append(item)
+        if len(window) > size:
+            yield window.popleft()
+    yield from window
+
+def synthesize_segments(text, Language="American English",voice="af_bella", speed=1, backend=None):
+    """Yields one segment dict (text, int16 audio, words) per pipeline chunk, in order, as soon as it is ready.
+
+    text is raw: it is split into sentences (split_units) and every sentence is
+    cleaned, phonemized and synthesized on its own, so the first segment only
+    waits for the first sentence's G2P.
+
+    Chunks of sentences already synthesized with the same voice, speed,
+    language and backend come from the segment cache, wherever the sentence now
+    sits; only new or changed sentences run through the model, either here or
+    spread over the worker pool. voice may be a mix such as
+    "af_bella:0.7,af_heart:0.3". backend picks one of
+    inference_backends.BACKENDS, None means KOKORO_BACKEND.
+    """
+    backend = backend or INFERENCE_BACKEND
+    pipeline = update_pipeline(Language)
+    voice = prepare_voice(pipeline, voice)
+    with_words = Language in ["American English", "British English"]
+    synthesizer = get_parallel_synthesizer()
+    model = None if synthesizer else get_backend_model(backend)
+
+    def plan(unit, index, chunk):
+        # Keyed on the sentence, so an edit elsewhere in the article never moves this chunk's boundaries;
+        # with_words too, since an unknown language falls back to the English pipeline without words
+        key = cache_key("segment-v4", pipeline.lang_code, with_words, voice, float(speed), backend, unit, index,
+                        chunk.phonemes)
+        files = get_segment_cache().get(key)
+        if files:
+            try:
+                return key, chunk, load_segment(files)
+            except OSError:
+                pass  # Evicted between lookup and read, synthesize again
+        if synthesizer:
+            return key, chunk, synthesizer.submit(chunk.phonemes, voice, speed, backend=backend)
+        return key, chunk, None
+
+    units = (clean_text(unit) for unit in split_units(text))
+    planned = (plan(unit, index, chunk) for unit in units if unit
+               for index, chunk in enumerate(phonemize(pipeline, unit, split_pattern=r'\n+')))
+    if synthesizer:
+        # Keep the pool busy with the next chunks while this one streams, without phonemizing the whole text first
+        planned = lookahead(planned, TTS_LOOKAHEAD)
+    for key, chunk, found in planned:
+        if isinstance(found, dict):
+            yield found
+            continue
+        if found is None:
+            with timed("segment_synthesis"):
+                result = infer_chunk(pipeline, chunk, voice, speed, model=model)
+        else:
+            result = finish_chunk(chunk, found.result())
+        segment = segment_from_result(result, with_words=with_words)
+        get_segment_cache().put(key, lambda entry_dir: save_segment(entry_dir, segment))
+        yield segment
+
+def stream_segments(text, Language="American English",voice="af_bella", speed=1, backend=None):
+    """Streaming variant of generate_and_save_audio: yields each segment with absolute word timestamps."""
+    offset = 0  # Samples emitted so far
+    for i, segment in enumerate(synthesize_segments(text, Language=Language, voice=voice, speed=speed, backend=backend)):
+        start = offset / SAMPLE_RATE
+        words = []
+        for word in segment["words"]:
+            words.append({
+                "word": word["word"],
+                "start": None if word["start"] is None else round(word["start"] + start, 3),
+                "end": None if word["end"] is None else round(word["end"] + start, 3),
+            })
+        offset += len(segment["audio"])
+        yield {
+            "index": i,
+            "text": segment["text"],
+            "audio": segment["audio"],
+            "start": round(start, 3),
+            "duration": round(len(segment["audio"]) / SAMPLE_RATE, 3),
+            "words": words,
+        }
+
+def synthesize(text, Language="American English",voice="af_bella", speed=1,remove_silence=False,keep_silence_up_to=0.05,backend=None):
+    """Synthesizes text into one int16 buffer plus per-segment timestamps, without touching disk.
+
+    Word times are relative to their segment, whose start in the buffer is
+    recorded with it. With remove_silence, long pauses are collapsed as segments arrive and the word
+    timestamps are moved along with the cuts.
+    """
     timestamps={}
-    with wave.open(save_path, 'wb') as wav_file:
-        # Set the WAV file parameters
-        wav_file.setnchannels(1)  # Mono audio
-        wav_file.setsampwidth(2)  # 2 bytes per sample (16-bit audio)
-        wav_file.setframerate(24000)  # Sample rate
-        for i, result in enumerate(generator):
-          gs = result.graphemes # str
-        #   print(f"\n{i}: {gs}")
-          ps = result.phonemes # str
-          # audio = result.audio.cpu().numpy()
-          audio = result.audio
-          tokens = result.tokens # List[en.MToken]
-          timestamps[i]={"text":gs,"words":[]}
-          if Language in ["American English", "British English"]:
-            for t in tokens:
-                # print(t.text, repr(t.whitespace), t.start_ts, t.end_ts)
-                timestamps[i]["words"].append({"word":t.text,"start":t.start_ts,"end":t.end_ts})
-          audio_np = audio.numpy()  # Convert Tensor to NumPy array
-          audio_int16 = (audio_np * 32767).astype(np.int16)  # Scale to 16-bit range
-          audio_bytes = audio_int16.tobytes()  # Convert to bytes
-          # Write the audio chunk to the WAV file
-          wav_file.writeframes(audio_bytes)
-    if remove_silence:            
-      keep_silence = int(keep_silence_up_to * 1000)
-      new_wave_file=remove_silence_function(save_path,minimum_silence=keep_silence)
-      return new_wave_file,timestamps
+    chunks=[]
+    trimmer = SilenceTrimmer(sample_rate=SAMPLE_RATE, keep_silence=int(keep_silence_up_to * 1000)) if remove_silence else None
+    segment_starts={}
+    offset = 0  # Samples synthesized so far
+    for i, segment in enumerate(synthesize_segments(text, Language=Language, voice=voice, speed=speed, backend=backend)):
+        # start: where the segment begins in the returned audio, in seconds
+        timestamps[i]={"text":segment["text"],"words":segment["words"],"start":round(offset / SAMPLE_RATE, 3)}
+        segment_starts[i] = offset
+        offset += len(segment["audio"])
+        chunks.append(trimmer.feed(segment["audio"]) if trimmer else segment["audio"])
+    if trimmer:
+        chunks.append(trimmer.flush())
+        for i, start in segment_starts.items():
+            timestamps[i]["words"] = trimmer.remap_words(timestamps[i]["words"], start)
+            timestamps[i]["start"] = round(trimmer.map_sample(start) / SAMPLE_RATE, 3)
+    audio = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int16)
+    return audio,timestamps
+
+def generate_and_save_audio(text, Language="American English",voice="af_bella", speed=1,remove_silence=False,keep_silence_up_to=0.05):
+    audio, timestamps = synthesize(text, Language=Language, voice=voice, speed=speed,
+                                   remove_silence=remove_silence, keep_silence_up_to=keep_silence_up_to)
+    save_path = write_wav(tts_file_name(clean_text(text),Language), audio)
     return save_path,timestamps
 
+# Set once warm_up() has loaded the model and run a synthesis end to end
+ready = threading.Event()
+
+def warm_up(Language="American English", voice="af_bella"):
+    """Loads the model, the pipeline, the voices and the caches and runs one short synthesis, bypassing the caches.
+
+    With KOKORO_TTS_WORKERS, that synthesis also runs once on every worker process.
+    """
+    start = time.perf_counter()
+    pipeline = update_pipeline(Language)
+    if MMAP_ENABLED:
+        mapped = voice_store(pipeline_pool.repo_id).preload(get_voice_names(pipeline_pool.repo_id))
+        print(f"Memory-mapped {mapped} voice packs")
+    for result in pipeline("Warming up.", voice=voice):
+        pass
+    get_g2p_cache()
+    get_segment_cache()
+    get_audio_cache()
+    synthesizer = get_parallel_synthesizer()
+    if synthesizer:
+        # Workers start lazily; ready means every one of them has loaded its model
+        workers = synthesizer.warm_up(result.phonemes, voice)
+        print(f"Warmed up {len(workers)} TTS worker processes")
+    ready.set()
+    print(f"Warm-up finished in {time.perf_counter() - start:.2f}s")
+
+def is_ready():
+    """True once warm_up() has finished."""
+    return ready.is_set()
+
+@timed_function("adjust_timestamps")
 def adjust_timestamps(timestamp_dict):
+    """Flattens per-segment word timestamps into one list of absolute times.
+
+    Every segment is offset by its "start", the position of its audio in the
+    output. Timestamps saved without one are chained after the previous word.
+    """
     adjusted_timestamps = []
     last_end_time = 0  # Tracks the last word's end time
 
     for segment_id in sorted(timestamp_dict.keys()):
         segment = timestamp_dict[segment_id]
-        words = segment["words"]
+        offset = segment.get("start", last_end_time)
 
-        for word_entry in words:
+        for word_entry in segment["words"]:
             # Skip word entries with start or end time as None or 0
             if word_entry["start"] in [None, 0] and word_entry["end"] in [None, 0]:
                 continue
 
-            # Fill in None values with the last valid timestamp or use 0 as default
-            word_start = word_entry["start"] if word_entry["start"] is not None else last_end_time
-            word_end = word_entry["end"] if word_entry["end"] is not None else word_start  # Use word_start if end is None
-
-            new_start = word_start + last_end_time
-            new_end = word_end + last_end_time
+            # Words without a start begin where the previous word ended
+            new_start = word_entry["start"] + offset if word_entry["start"] is not None else last_end_time
+            new_end = word_entry["end"] + offset if word_entry["end"] is not None else new_start  # Use the start if end is None
 
             adjusted_timestamps.append({
                 "word": word_entry["word"],
                 "start": round(new_start, 3),
                 "end": round(new_end, 3)
             })
-
-        # Update last_end_time to the last word's end time in this segment
-        if words:
             last_end_time = adjusted_timestamps[-1]["end"]
 
     return adjusted_timestamps
@@ -242,34 +474,31 @@ def adjust_timestamps(timestamp_dict):
 
 import string
 
-def write_word_srt(word_level_timestamps, output_file="word.srt", skip_punctuation=True):
-    with open(output_file, "w", encoding="utf-8") as f:
-        index = 1  # Track subtitle numbering separately
-
-        for entry in word_level_timestamps:
-            word = entry["word"]
-            
-            # Skip punctuation if enabled
-            if skip_punctuation and all(char in string.punctuation for char in word):
-                continue
-
-            start_time = entry["start"]
-            end_time = entry["end"]
-
-            # Convert seconds to SRT time format (HH:MM:SS,mmm)
-            def format_srt_time(seconds):
-                hours = int(seconds // 3600)
-                minutes = int((seconds % 3600) // 60)
-                sec = int(seconds % 60)
-                millisec = int((seconds % 1) * 1000)
-                return f"{hours:02}:{minutes:02}:{sec:02},{millisec:03}"
+def word_cues(word_level_timestamps, skip_punctuation=True):
+    """Returns the (start, end, word) cues that make up the word-level subtitles."""
+    cues = []
+    for entry in word_level_timestamps:
+        word = entry["word"]
+        
+        # Skip punctuation if enabled
+        if skip_punctuation and all(char in string.punctuation for char in word):
+            continue
+        cues.append((entry["start"], entry["end"], word))
+    return cues
 
-            start_srt = format_srt_time(start_time)
-            end_srt = format_srt_time(end_time)
+def write_word_srt(word_level_timestamps, output_file="word.srt", skip_punctuation=True):
+    # Convert seconds to SRT time format (HH:MM:SS,mmm)
+    def format_srt_time(seconds):
+        hours = int(seconds // 3600)
+        minutes = int((seconds % 3600) // 60)
+        sec = int(seconds % 60)
+        millisec = int((seconds % 1) * 1000)
+        return f"{hours:02}:{minutes:02}:{sec:02},{millisec:03}"
 
-            # Write entry to SRT file
-            f.write(f"{index}\n{start_srt} --> {end_srt}\n{word}\n\n")
-            index += 1  # Increment subtitle number
+    with open(output_file, "w", encoding="utf-8") as f:
+        # Write entry to SRT file, numbering subtitles from 1
+        for index, (start_time, end_time, word) in enumerate(word_cues(word_level_timestamps, skip_punctuation), start=1):
+            f.write(f"{index}\n{format_srt_time(start_time)} --> {format_srt_time(end_time)}\n{word}\n\n")
 
 import string
 
@@ -373,8 +602,11 @@ def fix_punctuation(text):
 
 
 
-def make_json(word_timestamps, json_file_name):
+def sentence_timeline(word_timestamps):
+    """Groups word timestamps into {sentence_id: {text, duration, start, end, words}}."""
     data = {}
+    if not word_timestamps:
+        return data
     temp = []
     inside_quote = False  # Track if we are inside a quoted sentence
     start_time = word_timestamps[0]['start']  # Initialize with the first word's start time
@@ -440,6 +672,11 @@ def make_json(word_timestamps, json_file_name):
             'end': end_time,
             'words': words_in_sentence
         }
+    return data
+
+
+def make_json(word_timestamps, json_file_name):
+    data = sentence_timeline(word_timestamps)
 
     # Write data to JSON file
     with open(json_file_name, 'w') as json_file:
@@ -465,25 +702,101 @@ def save_current_data():
     os.makedirs(last_dir, exist_ok=True)
     
      
-def KOKORO_TTS_API(text, Language="American English",voice="af_bella", speed=1,translate_text=False,remove_silence=False,keep_silence_up_to=0.05):
+# Finished TTS outputs are cached on disk, keyed by the request that produced them
+AUDIO_CACHE_DIR = os.environ.get("KOKORO_AUDIO_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "tts_cache"))
+AUDIO_CACHE_MAX_BYTES = int(float(os.environ.get("KOKORO_AUDIO_CACHE_MAX_MB", 2048)) * 1024 * 1024)
+audio_cache = None
+
+def get_audio_cache():
+    """The audio cache, scanned on first use."""
+    global audio_cache
+    with caches_lock:
+        if audio_cache is None:
+            audio_cache = DiskCache(AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_BYTES)
+    return audio_cache
+
+def write_wav(path, audio):
+    """Writes an int16 mono buffer to a WAV file."""
+    with wave.open(path, 'wb') as wav_file:
+        wav_file.setnchannels(1)  # Mono audio
+        wav_file.setsampwidth(2)  # 2 bytes per sample (16-bit audio)
+        wav_file.setframerate(SAMPLE_RATE)  # Sample rate
+        wav_file.writeframes(audio.tobytes())
+    return path
+
+def read_wav(path):
+    """Reads a 16-bit mono WAV file into an int16 buffer."""
+    with wave.open(path, 'rb') as wav_file:
+        return np.frombuffer(wav_file.readframes(wav_file.getnframes()), dtype=np.int16)
+
+def write_tts_outputs(output_dir, audio, timestamps, Language):
+    """Writes audio, timestamps and (for English) the SRTs and duration JSON into output_dir."""
+    files = {"audio": write_wav(os.path.join(output_dir, "audio.wav"), audio)}
+    files["timestamps"] = os.path.join(output_dir, "timestamps.json")
+    with open(files["timestamps"], "w", encoding="utf-8") as f:
+        json.dump([timestamps[i] for i in sorted(timestamps)], f, ensure_ascii=False)
+    if Language in ["American English", "British English"]:
+        word_level_timestamps=adjust_timestamps(timestamps)
+        files["word_level"] = os.path.join(output_dir, "word_level.srt")
+        files["sentence"] = os.path.join(output_dir, "sentence.srt")
+        files["duration"] = os.path.join(output_dir, "duration.json")
+        with timed("subtitle_files"):
+            write_word_srt(word_level_timestamps, output_file=files["word_level"], skip_punctuation=True)
+            write_sentence_srt(word_level_timestamps, output_file=files["sentence"], min_pause=0.01)
+            make_json(word_level_timestamps, files["duration"])
+    return files
+
+def read_timestamps(path):
+    with open(path, encoding="utf-8") as f:
+        return dict(enumerate(json.load(f)))
+
+def tts_cache_key(text, Language, voice, speed, translate_text, remove_silence, keep_silence_up_to, backend=None):
+    """Cache key: the cleaned sentences plus every option that changes the output."""
+    # Line breaks end a sentence (see split_units), so they count even though clean_text folds them
+    return cache_key("tts-v5", [clean_text(unit) for unit in split_units(text)], Language, normalize_voice(voice), float(speed), bool(translate_text),
+                     bool(remove_silence), float(keep_silence_up_to) if remove_silence else None,
+                     backend or INFERENCE_BACKEND)
+
+def cached_tts(text, Language="American English",voice="af_bella", speed=1,translate_text=False,remove_silence=False,keep_silence_up_to=0.05,backend=None):
+    """Returns (files, audio, timestamps), reusing the cached result of an identical earlier request."""
+    key = tts_cache_key(text, Language, voice, speed, translate_text, remove_silence, keep_silence_up_to, backend)
+    files = get_audio_cache().get(key)
+    if files:
+        try:
+            return files, read_wav(files["audio"]), read_timestamps(files["timestamps"])
+        except OSError:
+            pass  # Evicted between lookup and read, synthesize again
+
     if translate_text:    
         text=bulk_translate(text, Language, chunk_size=500)
-    save_path,timestamps=generate_and_save_audio(text=text, Language=Language,voice=voice, speed=speed,remove_silence=remove_silence,keep_silence_up_to=keep_silence_up_to)
-    if remove_silence==False:
-        if Language in ["American English", "British English"]:
-            word_level_timestamps=adjust_timestamps(timestamps)
-            word_level_srt = modify_filename(save_path.replace(".wav", ".srt"), prefix="word_level_")
-            normal_srt = modify_filename(save_path.replace(".wav", ".srt"), prefix="sentence_")
-            json_file = modify_filename(save_path.replace(".wav", ".json"), prefix="duration_")
-            write_word_srt(word_level_timestamps, output_file=word_level_srt, skip_punctuation=True)
-            write_sentence_srt(word_level_timestamps, output_file=normal_srt, min_pause=0.01)
-            make_json(word_level_timestamps, json_file)
+    audio, timestamps = synthesize(text, Language=Language, voice=voice, speed=speed,
+                                   remove_silence=remove_silence, keep_silence_up_to=keep_silence_up_to, backend=backend)
+    files = get_audio_cache().put(key, lambda entry_dir: write_tts_outputs(entry_dir, audio, timestamps, Language))
+    return files, audio, timestamps
+
+def KOKORO_TTS_API(text, Language="American English",voice="af_bella", speed=1,translate_text=False,remove_silence=False,keep_silence_up_to=0.05,save_to_last=False,backend=None):
+    """Returns uniquely named copies of the audio and subtitle files for text.
+
+    Only the file-based script chain (auto_tts -> create_final_video) needs
+    save_to_last, which also replaces the shared last/ directory with them.
+    voice is a stock voice or a weighted mix such as "af_bella:0.7,af_heart:0.3".
+    backend overrides KOKORO_BACKEND for this call (torch, torch-int8, onnx, onnx-int8).
+    """
+    files, _, _ = cached_tts(text, Language=Language, voice=voice, speed=speed, translate_text=translate_text,
+                             remove_silence=remove_silence, keep_silence_up_to=keep_silence_up_to, backend=backend)
+    # Hand out copies named after the text, the cache entry may be evicted later
+    save_path = shutil.copy(files["audio"], tts_file_name(clean_text(text), Language))
+    if "word_level" in files:
+        word_level_srt = shutil.copy(files["word_level"], modify_filename(save_path.replace(".wav", ".srt"), prefix="word_level_"))
+        normal_srt = shutil.copy(files["sentence"], modify_filename(save_path.replace(".wav", ".srt"), prefix="sentence_"))
+        json_file = shutil.copy(files["duration"], modify_filename(save_path.replace(".wav", ".json"), prefix="duration_"))
+        if save_to_last:
             save_current_data()
             shutil.copy(save_path, "./last/")
             shutil.copy(word_level_srt, "./last/")
             shutil.copy(normal_srt, "./last/")
             shutil.copy(json_file, "./last/")
-            return save_path,save_path,word_level_srt,normal_srt,json_file
+        return save_path,save_path,word_level_srt,normal_srt,json_file
     return save_path,save_path,None,None,None    
     
     
@@ -491,6 +804,7 @@ def KOKORO_TTS_API(text, Language="American English",voice="af_bella", speed=1,t
 
 
 def ui():
+    import gradio as gr
     def toggle_autoplay(autoplay):
         return gr.Audio(interactive=False, label='Output Audio', autoplay=autoplay)
 
@@ -521,7 +835,8 @@ def ui():
                     language_name = gr.Dropdown(lang_list, label="🌍 Select Language", value=lang_list[0])
 
                 with gr.Row():
-                    voice_name = gr.Dropdown(voice_names, label="🎙️ Choose VoicePack", value='af_heart')#voice_names[0])
+                    voice_name = gr.Dropdown(voice_names, label="🎙️ Choose VoicePack", value='af_heart', allow_custom_value=True,
+                                             info="Or type a mix, e.g. af_bella:0.7,af_heart:0.3")#voice_names[0])
 
                 with gr.Row():
                     generate_btn = gr.Button('🚀 Generate', variant='primary')
@@ -553,6 +868,7 @@ def ui():
     return demo
 
 def tutorial():
+    import gradio as gr
     # Markdown explanation for language code
     explanation = """
     ## Language Code Explanation:
@@ -588,6 +904,8 @@ import click
 @click.option("--debug", is_flag=True, default=False, help="Enable debug mode.")
 @click.option("--share", is_flag=True, default=False, help="Enable sharing of the interface.")
 def main(debug, share):
+    import gradio as gr
+    warm_up()
     demo1 = ui()
     demo2 = tutorial()
     demo = gr.TabbedInterface([demo1, demo2],["Multilingual TTS","VoicePack Explanation"],title="Kokoro TTS")#,theme='JohnSmith9982/small_and_pretty')
@@ -600,9 +918,5 @@ def main(debug, share):
 
 
 
-# Initialize default pipeline
-last_used_language = "a"
-pipeline = KPipeline(lang_code=last_used_language)
-temp_folder = create_audio_dir()
 if __name__ == "__main__":
     main()    
\ No newline at end of file
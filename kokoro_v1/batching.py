@@ -0,0 +1,179 @@
+"""Cross-request micro-batching of KModel forward passes.
+
+Requests synthesizing at the same time each call the model for one chunk.
+BatchingModel stands in for the KModel on the pipelines: every call is queued
+on a BatchScheduler, which collects calls for a short window, groups them by
+speed and similar phoneme length and runs the text side of each group as one
+padded forward pass. Every caller gets back exactly its own audio and
+durations. The decoder, most of the compute, still runs per item, so this
+only saves the text side (see scripts/benchmark.py --batching).
+
+Voices do not need to match within a group, the style vector is per item.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import torch
+from torch.nn.utils.rnn import pack_padded_sequence, pad_packed_sequence
+
+from inference_backends import tokenize
+from metrics import observe
+
+
+def _lstm(lstm, x, lengths, total_length):
+    # Run a batch_first LSTM over padded x without letting the padding leak into the backward direction
+    packed = pack_padded_sequence(x, lengths, batch_first=True, enforce_sorted=False)
+    out, _ = lstm(packed)
+    out, _ = pad_packed_sequence(out, batch_first=True, total_length=total_length)
+    return out
+
+
+@torch.no_grad()
+def batched_forward(model, token_lists, ref_s, speed=1):
+    """KModel.forward_with_tokens for several inputs at once.
+
+    token_lists are input ids from inference_backends.tokenize() and ref_s is
+    (batch, 256), one style vector per item. Returns one (audio, pred_dur) pair
+    per item, the same as running each input alone.
+
+    Only the text side (PL-BERT, the duration and text encoders) runs padded;
+    it masks or packs every step, so padding never reaches a real token. The F0/N
+    predictor and the decoder normalize over time (AdaIN), so they run per item
+    on that item's own frames.
+    """
+    device = model.device
+    batch = len(token_lists)
+    lengths = torch.tensor([len(tokens) for tokens in token_lists], dtype=torch.long)
+    max_len = int(lengths.max())
+    input_ids = torch.zeros((batch, max_len), dtype=torch.long)
+    for i, tokens in enumerate(token_lists):
+        input_ids[i, :len(tokens)] = torch.tensor(tokens, dtype=torch.long)
+    input_ids = input_ids.to(device)
+    text_mask = (torch.arange(max_len).unsqueeze(0) + 1 > lengths.unsqueeze(1)).to(device)  # True on padding
+    ref_s = ref_s.to(device)
+    s = ref_s[:, 128:]
+
+    bert_dur = model.bert(input_ids, attention_mask=(~text_mask).int())
+    d_en = model.bert_encoder(bert_dur).transpose(-1, -2)
+    d = model.predictor.text_encoder(d_en, s, lengths, text_mask)
+    x = _lstm(model.predictor.lstm, d, lengths, max_len)
+    duration = torch.sigmoid(model.predictor.duration_proj(x)).sum(axis=-1) / speed
+    pred_dur = torch.round(duration).clamp(min=1).long()
+    t_en = model.text_encoder(input_ids, lengths, text_mask)
+
+    outputs = []
+    for i in range(batch):
+        n = int(lengths[i])
+        item_dur = pred_dur[i, :n]
+        indices = torch.repeat_interleave(torch.arange(n, device=device), item_dur)
+        alignment = torch.zeros((n, indices.shape[0]), device=device)
+        alignment[indices, torch.arange(indices.shape[0], device=device)] = 1
+        alignment = alignment.unsqueeze(0)
+        en = d[i:i + 1, :n].transpose(-1, -2) @ alignment
+        F0, N = model.predictor.F0Ntrain(en, s[i:i + 1])
+        asr = t_en[i:i + 1, :, :n] @ alignment
+        audio = model.decoder(asr, F0, N, ref_s[i:i + 1, :128]).squeeze()
+        outputs.append((audio.cpu(), item_dur.cpu()))
+    return outputs
+
+
+class BatchScheduler:
+    """Collects model calls for up to `window` seconds and runs them in padded batches.
+
+    Calls are grouped by speed and by phoneme length in buckets of
+    `length_bucket`, so little of a batch is padding; a group has at most
+    `max_batch` items. A lone call runs through the model unchanged.
+    """
+
+    def __init__(self, model, window=0.01, max_batch=8, length_bucket=64):
+        self.model = model
+        self.window = window
+        self.max_batch = max_batch
+        self.length_bucket = length_bucket
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        threading.Thread(target=self._run, name="batch-scheduler", daemon=True).start()
+
+    def submit(self, phonemes, ref_s, speed=1):
+        """Queues one forward pass; the Future resolves to a KModel.Output."""
+        future = Future()
+        self._queue.put((phonemes, ref_s, float(speed), future))
+        return future
+
+    def _collect(self):
+        pending = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(pending) < self.max_batch * 4:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                pending.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return pending
+
+    def _run(self):
+        while True:
+            groups = {}
+            for item in self._collect():
+                phonemes, _, speed, _ = item
+                groups.setdefault((speed, len(phonemes) // self.length_bucket), []).append(item)
+            for (speed, _), items in groups.items():
+                for i in range(0, len(items), self.max_batch):
+                    self._forward(items[i:i + self.max_batch], speed)
+
+    def _forward(self, items, speed):
+        from kokoro import KModel
+        start = time.perf_counter()
+        try:
+            if len(items) == 1:
+                phonemes, ref_s, _, _ = items[0]
+                outputs = [self.model(phonemes, ref_s, speed, return_output=True)]
+            else:
+                token_lists = [tokenize(self.model.vocab, self.model.context_length, phonemes)
+                               for phonemes, _, _, _ in items]
+                ref_s = torch.cat([ref_s.reshape(1, -1) for _, ref_s, _, _ in items])
+                outputs = [KModel.Output(audio=audio, pred_dur=pred_dur)
+                           for audio, pred_dur in batched_forward(self.model, token_lists, ref_s, speed)]
+        except Exception as e:
+            for _, _, _, future in items:
+                future.set_exception(e)
+            return
+        observe("batch_forward", time.perf_counter() - start)
+        with self._lock:
+            self._batches += 1
+            self._items += len(items)
+        for (_, _, _, future), output in zip(items, outputs):
+            future.set_result(output)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "batches": self._batches,
+                "items": self._items,
+                "mean_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+            }
+
+
+class BatchingModel:
+    """Drop-in for a KModel on a KPipeline that sends every call through a BatchScheduler."""
+
+    def __init__(self, model, **scheduler_options):
+        self.model = model
+        self.scheduler = BatchScheduler(model, **scheduler_options)
+
+    def __call__(self, phonemes, ref_s, speed=1, return_output=False):
+        output = self.scheduler.submit(phonemes, ref_s, speed).result()
+        return output if return_output else output.audio
+
+    def __getattr__(self, name):
+        # device, vocab, repo_id, ... come from the wrapped model
+        return getattr(self.model, name)
+
+    def stats(self):
+        return self.scheduler.stats()
@@ -0,0 +1,169 @@
+"""Process-wide cache of grapheme-to-phoneme results.
+
+KPipeline runs G2P on every paragraph (English) or chunk (other languages) of
+every request. CachedG2P wraps a pipeline's g2p, splits the text into
+sentences and looks each one up by language and normalized text, so repeated
+intros, outros and boilerplate skip G2P entirely. For English the espeak
+fallback for out-of-vocabulary words (names, jargon) is cached per word too.
+
+The cache is a bounded LRU shared by all pipelines and can be pickled to disk
+at exit and loaded again on start.
+"""
+import atexit
+import copy
+import os
+import pickle
+import re
+import threading
+from collections import OrderedDict
+
+from metrics import timed
+
+
+def normalize_text(text):
+    return " ".join(text.split())
+
+
+def split_sentences(text):
+    """Sentences of text, each keeping the whitespace that follows it."""
+    parts = re.split(r'(?<=[.!?])(\s+)', text)
+    sentences = [sentence + whitespace for sentence, whitespace in zip(parts[0::2], parts[1::2] + [""])]
+    return [sentence for sentence in sentences if sentence.strip()]
+
+
+class G2PCache:
+    """LRU of at most max_entries G2P results, optionally persisted to path."""
+
+    def __init__(self, max_entries=20000, path=None):
+        self.max_entries = max_entries
+        self.path = path
+        self.enabled = True  # When False every lookup misses and nothing is stored
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = {"sentence": 0, "word": 0}
+        self._misses = {"sentence": 0, "word": 0}
+        if path:
+            self.load()
+            atexit.register(self.save)
+
+    def get(self, level, key):
+        with self._lock:
+            value = self._entries.get((level, key)) if self.enabled else None
+            if value is None:
+                self._misses[level] += 1
+                return None
+            self._entries.move_to_end((level, key))
+            self._hits[level] += 1
+            return value
+
+    def put(self, level, key, value):
+        with self._lock:
+            if not self.enabled:
+                return
+            self._entries[(level, key)] = value
+            self._entries.move_to_end((level, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def load(self):
+        try:
+            with open(self.path, "rb") as f:
+                entries = pickle.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"Could not load the G2P cache from {self.path}: {e}")
+            return
+        with self._lock:
+            self._entries.update(entries)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def save(self):
+        """Writes the cache to path, replacing the previous file in one step."""
+        if not self.path:
+            return
+        with self._lock:
+            entries = OrderedDict(self._entries)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(entries, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+
+    def stats(self):
+        with self._lock:
+            hits = sum(self._hits.values())
+            lookups = hits + sum(self._misses.values())
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": hits,
+                "misses": lookups - hits,
+                "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+                **{f"{level}_hits": count for level, count in self._hits.items()},
+                **{f"{level}_misses": count for level, count in self._misses.items()},
+            }
+
+
+class CachedFallback:
+    """Caches an English G2P's out-of-vocabulary fallback (espeak) per word."""
+
+    def __init__(self, fallback, lang_code, cache):
+        self.fallback = fallback
+        self.lang_code = lang_code
+        self.cache = cache
+
+    def __call__(self, token):
+        key = (self.lang_code, token.text)
+        result = self.cache.get("word", key)
+        if result is None:
+            result = self.fallback(token)
+            self.cache.put("word", key, result)
+        return result
+
+
+class CachedG2P:
+    """Stands in for KPipeline.g2p, answering sentence by sentence from a G2PCache.
+
+    Returns what the wrapped g2p returns, (phonemes, tokens), with the results
+    of the sentences joined. Tokens are copied in and out of the cache because
+    KPipeline writes timestamps onto them.
+    """
+
+    def __init__(self, g2p, lang_code, cache):
+        self.g2p = g2p
+        self.lang_code = lang_code
+        self.cache = cache
+        if getattr(g2p, "fallback", None) is not None:
+            g2p.fallback = CachedFallback(g2p.fallback, lang_code, cache)
+
+    def __getattr__(self, name):
+        # lexicon, fallback, ... of the wrapped g2p
+        return getattr(self.g2p, name)
+
+    def _sentence(self, sentence):
+        key = (self.lang_code, normalize_text(sentence))
+        cached = self.cache.get("sentence", key)
+        if cached is None:
+            cached = self.g2p(sentence)
+            self.cache.put("sentence", key, copy.deepcopy(cached))
+        else:
+            cached = copy.deepcopy(cached)
+        phonemes, tokens = cached
+        if tokens:
+            # Keep sentences apart when joined; the cached one may have been followed by other whitespace
+            tokens[-1].whitespace = sentence[len(sentence.rstrip()):][:1]
+        return phonemes, tokens
+
+    def __call__(self, text, *args, **kwargs):
+        with timed("g2p"):
+            if args or kwargs or not self.cache.enabled:
+                return self.g2p(text, *args, **kwargs)
+            results = [self._sentence(sentence) for sentence in split_sentences(text)]
+            if not results:
+                return self.g2p(text)
+            phonemes = " ".join(ps for ps, _ in results if ps)
+            if all(tokens is None for _, tokens in results):
+                return phonemes, None
+            return phonemes, [token for _, tokens in results for token in tokens or []]
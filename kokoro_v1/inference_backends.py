@@ -0,0 +1,190 @@
+"""CPU inference backends for the Kokoro model.
+
+Every backend loads an object that is called the way KModel is
+(phonemes, ref_s, speed, return_output), so it can sit on a KPipeline or in a
+synthesis worker unchanged:
+
+- torch: the fp32 KModel, the reference
+- torch-int8: KModel with its Linear and LSTM layers dynamically quantized to int8
+- onnx: KModel exported to ONNX and run on ONNX Runtime
+- onnx-int8: the ONNX graph with dynamically quantized int8 weights
+
+The ONNX graphs are exported once into ONNX_DIR and reused. check_parity()
+measures how far a backend drifts from the torch reference.
+"""
+import json
+import os
+import threading
+
+import numpy as np
+
+from mmap_store import MMAP_ENABLED, map_weights
+
+# torch, kokoro and onnxruntime are imported on first use, so importing this module stays cheap
+
+INFERENCE_BACKEND = os.environ.get("KOKORO_BACKEND", "torch")
+# Intra-op threads per model (torch or ONNX Runtime); 0 leaves the library default
+INFERENCE_THREADS = int(os.environ.get("KOKORO_BACKEND_THREADS", 0)) or None
+ONNX_DIR = os.environ.get("KOKORO_ONNX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "onnx_models"))
+ONNX_OPSET = 17
+
+_export_lock = threading.Lock()
+
+
+def tokenize(vocab, context_length, phonemes):
+    """Input ids for phonemes, with the BOS/EOS padding tokens KModel.forward adds."""
+    input_ids = [i for i in map(vocab.get, phonemes) if i is not None]
+    assert len(input_ids) + 2 <= context_length, (len(input_ids) + 2, context_length)
+    return [0, *input_ids, 0]
+
+
+def _kmodel(repo_id, threads=None):
+    import torch
+    from kokoro import KModel
+    if threads:
+        torch.set_num_threads(threads)
+    return KModel(repo_id=repo_id).eval()
+
+
+def load_torch(repo_id, threads=None):
+    model = _kmodel(repo_id, threads)
+    # Weights shared with every other process on the host through the page cache
+    return map_weights(model, repo_id) if MMAP_ENABLED else model
+
+
+def load_torch_int8(repo_id, threads=None):
+    import torch
+    # The quantized weights are new tensors, mapping the fp32 ones first would not save anything
+    model = _kmodel(repo_id, threads)
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear, torch.nn.LSTM}, dtype=torch.qint8,
+                                                  inplace=True)
+
+
+def onnx_path(repo_id, quantized=False):
+    """Path of the exported graph for repo_id, exporting (and quantizing) it on first use."""
+    name = repo_id.replace("/", "--")
+    path = os.path.join(ONNX_DIR, f"{name}.onnx")
+    quantized_path = os.path.join(ONNX_DIR, f"{name}.int8.onnx")
+    with _export_lock:
+        if not os.path.exists(path):
+            export_onnx(repo_id, path)
+        if quantized and not os.path.exists(quantized_path):
+            quantize_onnx(path, quantized_path)
+    return quantized_path if quantized else path
+
+
+def export_onnx(repo_id, path):
+    import torch
+    from kokoro import KModel
+    from kokoro.model import KModelForONNX
+    print(f"Exporting {repo_id} to {path}...")
+    # Complex STFT ops have no ONNX export
+    model = KModel(repo_id=repo_id, disable_complex=True).eval()
+    input_ids = torch.LongTensor([tokenize(model.vocab, model.context_length, "həlˈoʊ wˈɜɹld, ðɪs ɪz ɐ tˈɛst.")])
+    ref_s = torch.randn(1, 256)
+    speed = torch.tensor([1.0])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"  # Other processes only ever see a complete graph
+    torch.onnx.export(
+        KModelForONNX(model).eval(), (input_ids, ref_s, speed), tmp_path,
+        input_names=["input_ids", "ref_s", "speed"],
+        output_names=["waveform", "duration"],
+        dynamic_axes={"input_ids": {1: "tokens"}, "waveform": {0: "samples"}, "duration": {0: "tokens"}},
+        opset_version=ONNX_OPSET,
+    )
+    os.replace(tmp_path, path)
+
+
+def quantize_onnx(path, quantized_path):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    print(f"Quantizing {path} to int8...")
+    tmp_path = f"{quantized_path}.{os.getpid()}.tmp"
+    quantize_dynamic(path, tmp_path, weight_type=QuantType.QInt8)
+    os.replace(tmp_path, quantized_path)
+
+
+class OnnxModel:
+    """An exported Kokoro graph on ONNX Runtime, callable like a KModel."""
+
+    device = "cpu"
+
+    def __init__(self, path, repo_id, threads=None):
+        import onnxruntime as ort
+        from huggingface_hub import hf_hub_download
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.repo_id = repo_id
+        with open(hf_hub_download(repo_id=repo_id, filename="config.json"), encoding="utf-8") as f:
+            config = json.load(f)
+        self.vocab = config["vocab"]
+        self.context_length = config["plbert"]["max_position_embeddings"]
+
+    def __call__(self, phonemes, ref_s, speed=1, return_output=False):
+        import torch
+        from kokoro import KModel
+        input_ids = tokenize(self.vocab, self.context_length, phonemes)
+        waveform, duration = self.session.run(None, {
+            "input_ids": np.array([input_ids], dtype=np.int64),
+            "ref_s": ref_s.reshape(1, -1).cpu().numpy().astype(np.float32),
+            "speed": np.array([speed], dtype=np.float32),
+        })
+        audio = torch.from_numpy(waveform.reshape(-1))
+        pred_dur = torch.from_numpy(duration.reshape(-1).astype(np.int64))
+        return KModel.Output(audio=audio, pred_dur=pred_dur) if return_output else audio
+
+
+def load_onnx(repo_id, threads=None):
+    return OnnxModel(onnx_path(repo_id), repo_id, threads)
+
+
+def load_onnx_int8(repo_id, threads=None):
+    return OnnxModel(onnx_path(repo_id, quantized=True), repo_id, threads)
+
+
+BACKENDS = {"torch": load_torch, "torch-int8": load_torch_int8, "onnx": load_onnx, "onnx-int8": load_onnx_int8}
+
+
+def load_backend(name=INFERENCE_BACKEND, repo_id="hexgrad/Kokoro-82M", threads=INFERENCE_THREADS):
+    """Loads the model for backend name, with threads intra-op threads."""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend {name!r}, expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name](repo_id, threads)
+
+
+def check_parity(model, reference, phoneme_chunks, pack, speed=1):
+    """Compares model against reference (normally the torch backend) on the same inputs.
+
+    pack is a voice pack from KPipeline.load_voice. Per chunk, reports the
+    predicted durations (frames per token) that differ, the total length drift
+    and the waveform error over the common length. The vocoder adds noise, so
+    even the reference against itself is not bit-exact; compare the SNR of a
+    backend with that of the reference run twice.
+    """
+    import torch
+    results = []
+    for phonemes in phoneme_chunks:
+        ref_s = pack[len(phonemes) - 1]
+        with torch.no_grad():
+            expected = reference(phonemes, ref_s, speed, return_output=True)
+            actual = model(phonemes, ref_s, speed, return_output=True)
+        expected_dur = expected.pred_dur.numpy().astype(np.int64)
+        actual_dur = actual.pred_dur.numpy().astype(np.int64)
+        n = min(len(expected.audio), len(actual.audio))
+        a = expected.audio[:n].numpy().astype(np.float64)
+        b = actual.audio[:n].numpy().astype(np.float64)
+        error = a - b
+        signal_power = float(np.mean(a ** 2))
+        noise_power = float(np.mean(error ** 2))
+        results.append({
+            "phonemes": len(phonemes),
+            "duration_tokens_changed": int(np.sum(expected_dur != actual_dur)) if len(expected_dur) == len(actual_dur) else None,
+            "duration_max_frames": int(np.max(np.abs(expected_dur - actual_dur))) if len(expected_dur) == len(actual_dur) else None,
+            "length_drift_ms": round((len(actual.audio) - len(expected.audio)) / 24, 1),  # 24 samples per ms at 24 kHz
+            "waveform_max_abs": round(float(np.max(np.abs(error))), 5) if n else None,
+            "waveform_rmse": round(noise_power ** 0.5, 6) if n else None,
+            "snr_db": round(10 * np.log10(signal_power / noise_power), 2) if n and noise_power > 0 else None,
+        })
+    return results
@@ -0,0 +1,121 @@
+"""Background job queue for long-running video renders.
+
+Jobs run on a bounded thread pool so the API can answer immediately with a job
+id, and clients follow progress per stage while several renders run at once.
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFull(Exception):
+    """Raised when too many jobs are already waiting for a worker."""
+
+
+class Job:
+    """State of one queued job, including the status of each of its stages."""
+
+    def __init__(self, job_id, stage_names):
+        self.id = job_id
+        self.status = "queued"  # queued -> running -> done | failed
+        self.stage = None
+        self.stages = {name: {"status": "pending", "duration": None} for name in stage_names}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.version = 0  # Bumped on every change so watchers can tell something happened
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "stages": [{"name": name, **info} for name, info in self.stages.items()],
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobQueue:
+    """Runs submitted jobs on at most `max_workers` threads.
+
+    At most `max_queued` jobs may wait for a worker; finished jobs are kept for
+    `ttl` seconds so their status can still be polled.
+    """
+
+    def __init__(self, max_workers=2, max_queued=100, ttl=3600):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="video-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, stage_names=(), job_id=None):
+        """Queue fn(job) and return the Job; fn's return value becomes job.result."""
+        with self._lock:
+            self._prune()
+            if sum(1 for job in self._jobs.values() if job.status == "queued") >= self.max_queued:
+                raise QueueFull(f"{self.max_queued} jobs are already waiting")
+            job = Job(job_id or str(uuid.uuid4()), stage_names)
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job, fn):
+        self._update(job, status="running", started_at=time.time())
+        try:
+            result = fn(job)
+        except Exception as e:
+            print(f"Job {job.id} failed: {e}")
+            self._update(job, status="failed", error=str(e), finished_at=time.time())
+        else:
+            self._update(job, status="done", result=result, stage=None, finished_at=time.time())
+
+    def _update(self, job, **fields):
+        with self._lock:
+            for name, value in fields.items():
+                setattr(job, name, value)
+            job.version += 1
+
+    def update_stage(self, job, stage, status, duration=None):
+        """Record that `stage` of `job` is now "running", "done" or "failed"."""
+        with self._lock:
+            job.stages.setdefault(stage, {"status": "pending", "duration": None})
+            job.stages[stage]["status"] = status
+            job.stages[stage]["duration"] = duration
+            if status == "running":
+                job.stage = stage
+            job.version += 1
+
+    def _prune(self):
+        # Drop finished jobs older than the TTL; caller holds the lock
+        cutoff = time.time() - self.ttl
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished_at and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        """Returns (version, job dict) for a job, or None if it is unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return job.version, job.to_dict()
+
+    def stats(self):
+        """Queue depth and number of jobs in flight."""
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {
+            "max_workers": self.max_workers,
+            "queued": statuses.count("queued"),
+            "running": statuses.count("running"),
+            "done": statuses.count("done"),
+            "failed": statuses.count("failed"),
+        }
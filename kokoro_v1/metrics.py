@@ -0,0 +1,99 @@
+"""Prometheus metrics for the TTS and video pipeline.
+
+Hot paths record their latency in one histogram labelled by stage, via
+timed() or observe(). Counters that other components already keep (cache
+hits, the pipeline pool, the job queue) are read when Prometheus scrapes,
+through StatsCollector, instead of being duplicated here.
+"""
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+STAGE_SECONDS = Histogram(
+    "kokoro_stage_seconds",
+    "Time spent in each pipeline stage",
+    ["stage"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
+
+
+def observe(stage, seconds):
+    STAGE_SECONDS.labels(stage=stage).observe(seconds)
+
+
+@contextmanager
+def timed(stage):
+    """Records how long the with-block took under stage, also when it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def timed_function(stage):
+    """Decorator form of timed()."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class StatsCollector:
+    """Turns stats() dicts into gauges at scrape time.
+
+    caches maps a cache name to a callable returning a dict with hits, misses
+    and hit_ratio (DiskCache.stats, PipelinePool.stats, ...), plus bytes_saved
+    for caches that count it; jobs is a callable returning JobQueue.stats().
+    """
+
+    def __init__(self, caches, jobs=None):
+        self.caches = caches
+        self.jobs = jobs
+
+    def collect(self):
+        hits = GaugeMetricFamily("kokoro_cache_hits", "Cache hits since start", labels=["cache"])
+        misses = GaugeMetricFamily("kokoro_cache_misses", "Cache misses since start", labels=["cache"])
+        ratio = GaugeMetricFamily("kokoro_cache_hit_ratio", "Cache hit ratio since start", labels=["cache"])
+        saved = GaugeMetricFamily("kokoro_cache_bytes_saved", "Bytes served from the cache since start",
+                                  labels=["cache"])
+        for name, stats in self.caches.items():
+            try:
+                values = stats()
+            except Exception as e:
+                print(f"Could not collect {name} stats: {e}")
+                continue
+            hits.add_metric([name], values.get("hits", 0))
+            misses.add_metric([name], values.get("misses", 0))
+            ratio.add_metric([name], values.get("hit_ratio", 0.0))
+            if "bytes_saved" in values:
+                saved.add_metric([name], values["bytes_saved"])
+        yield hits
+        yield misses
+        yield ratio
+        yield saved
+
+        if self.jobs:
+            stats = self.jobs()
+            yield GaugeMetricFamily("kokoro_job_queue_depth", "Jobs waiting for a worker", value=stats["queued"])
+            yield GaugeMetricFamily("kokoro_jobs_in_flight", "Jobs currently running", value=stats["running"])
+            yield GaugeMetricFamily("kokoro_job_workers", "Jobs that can run at the same time", value=stats["max_workers"])
+            finished = GaugeMetricFamily("kokoro_jobs_finished", "Finished jobs still tracked, by outcome", labels=["status"])
+            finished.add_metric(["done"], stats["done"])
+            finished.add_metric(["failed"], stats["failed"])
+            yield finished
+
+
+def register_stats(caches, jobs=None):
+    REGISTRY.register(StatsCollector(caches, jobs))
+
+
+def render_latest():
+    """(body, content type) of the current metrics in the Prometheus text format."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,123 @@
+"""Memory-mapped voice packs and model weights.
+
+Voice packs are converted once to .npy files and opened read-only with
+mmap_mode="r"; the model weights are re-saved once and loaded with
+torch.load(mmap=True). Either way the tensors live in the page cache instead
+of private memory, so every process on the host that opens the same files
+(uvicorn/Gradio workers, synthesis workers) shares one physical copy.
+
+Nothing writes to these tensors: voice packs are only indexed and the model
+only runs under no_grad.
+"""
+import os
+import threading
+import warnings
+
+import numpy as np
+
+# torch and huggingface_hub are imported on first use, so importing this module stays cheap
+
+MMAP_ENABLED = os.environ.get("KOKORO_MMAP", "1") != "0"
+MMAP_DIR = os.environ.get("KOKORO_MMAP_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "mmap_store"))
+
+
+def store_dir(repo_id):
+    return os.path.join(MMAP_DIR, repo_id.replace("/", "--"))
+
+
+def _write_atomic(path, write):
+    # Other processes only ever see complete files
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def voice_file(repo_id, name):
+    """Path of the .npy copy of a voice pack, converting it from the repository on first use."""
+    path = os.path.join(store_dir(repo_id), "voices", f"{name}.npy")
+    if not os.path.exists(path):
+        import torch
+        from huggingface_hub import hf_hub_download
+        pack = torch.load(hf_hub_download(repo_id=repo_id, filename=f"voices/{name}.pt"), weights_only=True)
+        _write_atomic(path, lambda f: np.save(f, pack.numpy()))
+    return path
+
+
+def map_voice(path):
+    """A read-only tensor backed by the .npy file at path."""
+    import torch
+    array = np.load(path, mmap_mode="r")
+    with warnings.catch_warnings():
+        # from_numpy warns that the array is not writable; nothing writes to voice packs
+        warnings.simplefilter("ignore", UserWarning)
+        return torch.from_numpy(array)
+
+
+class VoiceStore(dict):
+    """Voice packs by name, memory-mapped on first lookup; a drop-in for KPipeline.voices.
+
+    KPipeline checks `voice in self.voices` before downloading a pack, so the
+    lookup maps the pack instead. Paths to .pt files and voices that cannot be
+    mapped fall through to KPipeline's own loading.
+    """
+
+    def __init__(self, repo_id):
+        super().__init__()
+        self.repo_id = repo_id
+        self._lock = threading.Lock()
+
+    def __contains__(self, name):
+        if dict.__contains__(self, name):
+            return True
+        if not isinstance(name, str) or name.endswith(".pt") or "," in name:
+            return False
+        with self._lock:
+            if not dict.__contains__(self, name):
+                try:
+                    self[name] = map_voice(voice_file(self.repo_id, name))
+                except Exception as e:
+                    print(f"Could not memory-map voice {name}: {e}")
+                    return False
+        return True
+
+    def preload(self, names=None):
+        """Maps every voice in names (default: every voice already converted) and returns how many are mapped."""
+        if names is None:
+            try:
+                names = [os.path.splitext(f)[0] for f in os.listdir(os.path.join(store_dir(self.repo_id), "voices"))
+                         if f.endswith(".npy")]
+            except FileNotFoundError:
+                names = []
+        return sum(1 for name in names if name in self)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def voice_store(repo_id):
+    """The process-wide VoiceStore for repo_id, shared by all pipelines."""
+    with _stores_lock:
+        if repo_id not in _stores:
+            _stores[repo_id] = VoiceStore(repo_id)
+        return _stores[repo_id]
+
+
+def map_weights(model, repo_id):
+    """Replaces the parameters of a loaded KModel with memory-mapped copies of the same weights.
+
+    The checkpoint is re-saved in torch's zip format on first use, which is
+    what torch.load(mmap=True) needs. The private copy the KModel constructor
+    loaded is freed once its tensors are replaced.
+    """
+    import torch
+    path = os.path.join(store_dir(repo_id), "model.pt")
+    if not os.path.exists(path):
+        state = {name: module.state_dict() for name, module in model.named_children()}
+        _write_atomic(path, lambda f: torch.save(state, f))
+    checkpoint = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+    for name, state_dict in checkpoint.items():
+        getattr(model, name).load_state_dict(state_dict, assign=True)
+    return model
@@ -0,0 +1,183 @@
+"""In-process video pipeline: TTS -> subtitles -> render -> split.
+
+Every stage is a plain function that takes a JobContext, reads the artifacts
+earlier stages left on it and adds its own. Nothing is handed over through the
+filesystem, and the model stays loaded in the process between jobs.
+"""
+import os
+import time
+import uuid
+
+from workspace import Workspace
+from metrics import observe
+from app import cached_tts, adjust_timestamps, word_cues, sentence_timeline, SAMPLE_RATE
+from scripts.create_final_video import render_video
+from scripts.background_cache import BackgroundCache
+from scripts.ffmpeg_render import render_video_ffmpeg
+from scripts.parallel_render import render_video_parallel, MIN_SLICE_SECONDS
+from scripts.split_video import split_video, plan_split_points
+
+kokoro_dir = os.path.dirname(os.path.abspath(__file__))
+BACKGROUND_VIDEO_DIR = os.path.join(kokoro_dir, "background_videos")
+FINAL_VIDEOS_DIR = os.path.join(kokoro_dir, "final_videos")
+BACKGROUND_CACHE_DIR = os.environ.get("KOKORO_BACKGROUND_CACHE_DIR", os.path.join(kokoro_dir, "background_cache"))
+SPLIT_DURATION = 120  # Videos longer than this are split into parts
+RENDER_BACKENDS = ("moviepy", "ffmpeg")
+# Videos long enough for two slices are rendered in slices by this many processes (0 or 1 disables it)
+RENDER_WORKERS = int(os.environ.get("KOKORO_RENDER_WORKERS", 0))
+
+
+# Refreshed by the entry points (API startup, CLI), never on import: spawned workers re-import this module
+background_cache = BackgroundCache(BACKGROUND_VIDEO_DIR, BACKGROUND_CACHE_DIR)
+
+
+class StageError(Exception):
+    """Raised when a stage fails; remembers which stage it was."""
+
+    def __init__(self, stage, error):
+        super().__init__(f"{stage} failed: {error}")
+        self.stage = stage
+        self.error = error
+
+
+class JobContext:
+    """Inputs of one video job and the artifacts its stages produce.
+
+    Every file a stage writes goes into the job's own workspace, which is
+    created here unless one is passed in.
+    """
+
+    def __init__(self, title, content, request_id=None, Language="American English", voice="af_bella", speed=1.0,
+                 render_backend="moviepy", workspace=None):
+        if render_backend not in RENDER_BACKENDS:
+            raise ValueError(f"Unknown render backend {render_backend!r}, expected one of {RENDER_BACKENDS}")
+        self.request_id = request_id or str(uuid.uuid4())
+        self.title = title
+        self.content = content
+        self.Language = Language
+        self.voice = voice
+        self.speed = speed
+        self.render_backend = render_backend
+        self.workspace = workspace or Workspace(self.request_id)
+        self.artifacts = {}
+        self.timings = {}
+        self.on_output = None  # on_output(kind, path) is told about every output file as soon as it is complete
+
+    def emit(self, kind, path):
+        """Reports a finished output file ("final_video" or "part") to on_output."""
+        if self.on_output:
+            self.on_output(kind, path)
+
+
+def tts_stage(ctx):
+    """Synthesize title and content into an in-memory PCM buffer and word timestamps.
+
+    Articles that were synthesized before come straight from the audio cache.
+    """
+    # Extra newlines at the end to ensure all words are spoken
+    full_text = f"{ctx.title}\n\n{ctx.content}\n\n"
+    files, audio, timestamps = cached_tts(full_text, Language=ctx.Language, voice=ctx.voice, speed=ctx.speed)
+    ctx.artifacts['tts_files'] = files
+    if not len(audio):
+        raise ValueError("TTS produced no audio")
+    ctx.artifacts['audio'] = audio
+    ctx.artifacts['timestamps'] = timestamps
+    ctx.artifacts['duration'] = len(audio) / SAMPLE_RATE
+
+
+def subtitle_stage(ctx):
+    """Turn the segment timestamps into word-level subtitle cues and plan where to split.
+
+    Parts end on a sentence boundary whenever one falls close enough to the
+    SPLIT_DURATION mark; the renderer puts a keyframe at each of these points.
+    """
+    word_level_timestamps = adjust_timestamps(ctx.artifacts['timestamps'])
+    ctx.artifacts['word_timestamps'] = word_level_timestamps
+    ctx.artifacts['cues'] = word_cues(word_level_timestamps, skip_punctuation=True)
+    sentence_ends = [sentence['end'] for sentence in sentence_timeline(word_level_timestamps).values()]
+    ctx.artifacts['split_points'] = plan_split_points(ctx.artifacts['duration'], SPLIT_DURATION, sentence_ends)
+
+
+def render_stage(ctx):
+    """Render the final video from a random background, the PCM buffer and the cues.
+
+    The "ffmpeg" backend burns the cues in with libass in a single ffmpeg run;
+    "moviepy" composites them frame by frame in Python. Either way, long videos
+    are rendered as time slices in parallel when RENDER_WORKERS is set.
+    """
+    # Backgrounds are normalized once and reused by every render; pick() never waits for a transcode
+    background_video_path, background = background_cache.pick()
+    if not background_video_path:
+        raise FileNotFoundError(f"No background videos found in {BACKGROUND_VIDEO_DIR}")
+    print(f"Selected background video: {background['file']}")
+
+    output_path = ctx.workspace.path("final_video.mp4")
+    if RENDER_WORKERS > 1 and ctx.artifacts['duration'] >= 2 * MIN_SLICE_SECONDS:
+        final_video = render_video_parallel(background_video_path, ctx.artifacts['audio'], ctx.artifacts['cues'],
+                                            output_path, backend=ctx.render_backend,
+                                            workers=RENDER_WORKERS, sample_rate=SAMPLE_RATE,
+                                            keyframes=ctx.artifacts['split_points'],
+                                            background_duration=background['duration'])
+    elif ctx.render_backend == "ffmpeg":
+        final_video = render_video_ffmpeg(background_video_path, ctx.artifacts['audio'],
+                                          ctx.artifacts['cues'], output_path, sample_rate=SAMPLE_RATE,
+                                          keyframes=ctx.artifacts['split_points'])
+    else:
+        from moviepy.audio.AudioClip import AudioArrayClip  # Only the MoviePy backend needs it
+        # MoviePy wants float samples shaped (n_samples, n_channels)
+        samples = (ctx.artifacts['audio'].astype('float32') / 32768).reshape(-1, 1)
+        audio = AudioArrayClip(samples, fps=SAMPLE_RATE)
+        final_video = render_video(background_video_path, audio, ctx.artifacts['cues'], output_path,
+                                   keyframes=ctx.artifacts['split_points'])
+    ctx.artifacts['final_video'] = final_video
+    ctx.emit("final_video", final_video)
+
+
+def split_stage(ctx):
+    """Split the final video at the planned points when it is longer than SPLIT_DURATION.
+
+    Every part is reported to ctx.on_output as soon as ffmpeg has finished it.
+    """
+    if not ctx.artifacts['split_points']:
+        ctx.artifacts['parts'] = []
+        return
+    ctx.artifacts['parts'] = split_video(ctx.artifacts['final_video'], segment_duration=SPLIT_DURATION,
+                                         split_points=ctx.artifacts['split_points'], duration=ctx.artifacts['duration'],
+                                         on_part=lambda path: ctx.emit("part", path))
+
+
+VIDEO_STAGES = [
+    ("tts", tts_stage),
+    ("subtitles", subtitle_stage),
+    ("render", render_stage),
+    ("split", split_stage),
+]
+
+
+def run_stages(ctx, stages=VIDEO_STAGES, on_stage=None):
+    """Run stages in order on ctx.
+
+    on_stage(ctx, stage_name, status) is called with "running", "done" or "failed"
+    around every stage. The first failure is raised as a StageError.
+    """
+    for name, stage in stages:
+        print(f"\n{'='*50}")
+        print(f"Running stage {name}...")
+        print(f"{'='*50}\n")
+        if on_stage:
+            on_stage(ctx, name, "running")
+        start = time.perf_counter()
+        try:
+            stage(ctx)
+        except Exception as e:
+            ctx.timings[name] = round(time.perf_counter() - start, 3)
+            observe(name, ctx.timings[name])
+            if on_stage:
+                on_stage(ctx, name, "failed")
+            raise StageError(name, e) from e
+        ctx.timings[name] = round(time.perf_counter() - start, 3)
+        observe(name, ctx.timings[name])
+        print(f"Stage {name} finished in {ctx.timings[name]:.2f}s")
+        if on_stage:
+            on_stage(ctx, name, "done")
+    return ctx
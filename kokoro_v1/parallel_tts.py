@@ -0,0 +1,132 @@
+"""Synthesize pipeline chunks across a pool of worker processes.
+
+Each worker loads its own model once (any of inference_backends.BACKENDS) and
+only runs it on phoneme strings; G2P, chunking and timestamps stay in the
+parent, so results come back exactly as the serial path would produce them.
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import torch
+from kokoro import KModel
+
+from inference_backends import INFERENCE_BACKEND, load_backend, onnx_path
+from metrics import observe
+from mmap_store import MMAP_ENABLED, voice_store
+from voice_mix import blend, is_mix
+
+# Per-worker state, set up by _init_worker
+_repo_id = None
+_num_threads = None
+_default_backend = None
+_models = {}
+_voices = {}
+_warm_up_barrier = None
+
+
+def _init_worker(repo_id, num_threads, backend, warm_up_barrier):
+    global _repo_id, _num_threads, _default_backend, _voices, _warm_up_barrier
+    _repo_id, _num_threads, _default_backend = repo_id, num_threads, backend
+    _warm_up_barrier = warm_up_barrier
+    torch.set_num_threads(num_threads)
+    torch.set_num_interop_threads(1)
+    if MMAP_ENABLED:
+        # Map every voice the parent has converted, the pages are shared with it
+        _voices = voice_store(repo_id)
+        _voices.preload()
+    _get_model(backend)
+
+
+def _get_model(backend=None):
+    # The worker's own backend is loaded up front, others when a chunk first asks for them
+    backend = backend or _default_backend
+    if backend not in _models:
+        _models[backend] = load_backend(backend, _repo_id, _num_threads)
+    return _models[backend]
+
+
+def _load_voice(voice):
+    # Same rules as KPipeline.load_voice: a name, a .pt path, or a comma separated mix to average
+    if voice not in _voices and is_mix(voice):
+        # Normalized weighted mix from app.prepare_voice, blended once per host
+        _voices[voice] = blend(voice, _load_voice, _repo_id)
+    if voice not in _voices:
+        from huggingface_hub import hf_hub_download
+        packs = []
+        for name in voice.split(","):
+            if name in _voices:
+                packs.append(_voices[name])
+                continue
+            path = name if name.endswith(".pt") else hf_hub_download(repo_id=_repo_id, filename=f"voices/{name}.pt")
+            packs.append(torch.load(path, weights_only=True))
+        _voices[voice] = packs[0] if len(packs) == 1 else torch.mean(torch.stack(packs), dim=0)
+    return _voices[voice]
+
+
+def _infer(phonemes, voice, speed, backend=None):
+    start = time.perf_counter()
+    pack = _load_voice(voice)
+    output = _get_model(backend)(phonemes, pack[len(phonemes) - 1], speed, return_output=True)
+    return output.audio.numpy(), output.pred_dur.numpy(), time.perf_counter() - start
+
+
+def _warm_up(phonemes, voice, timeout):
+    _infer(phonemes, voice, 1)
+    # Hold on to this worker until every other one has taken a warm-up chunk as well
+    _warm_up_barrier.wait(timeout)
+    return os.getpid()
+
+
+class ParallelSynthesizer:
+    """Process pool running model inference, `workers` processes wide.
+
+    Threads are split between workers so the pool does not oversubscribe the
+    cores; workers are started (and load their `backend` model) on first submit,
+    or all together by warm_up().
+    """
+
+    def __init__(self, workers, repo_id="hexgrad/Kokoro-82M", threads_per_worker=None, backend=INFERENCE_BACKEND):
+        self.workers = workers
+        self.backend = backend
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+        if backend.startswith("onnx"):
+            onnx_path(repo_id, quantized=backend == "onnx-int8")  # Export once here, not in every worker
+        context = multiprocessing.get_context("spawn")  # Forking a process that already runs torch is unsafe
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(repo_id, self.threads_per_worker, backend, context.Barrier(workers)),
+        )
+
+    def warm_up(self, phonemes, voice, timeout=600):
+        """Starts every worker and runs one chunk on each, so all of them have loaded their model.
+
+        Returns the worker pids. Each warm-up chunk blocks its worker until all
+        workers have one, which is what spreads them one per worker.
+        """
+        futures = [self._executor.submit(_warm_up, phonemes, voice, timeout) for _ in range(self.workers)]
+        return {future.result() for future in futures}
+
+    def submit(self, phonemes, voice, speed=1, backend=None):
+        """Queues one chunk; the returned Future resolves to a KModel.Output.
+
+        backend overrides the workers' own backend for this chunk.
+        """
+        future = Future()
+
+        def done(worker_future):
+            try:
+                audio, pred_dur, seconds = worker_future.result()
+                observe("segment_synthesis", seconds)  # Time spent in the worker, not waiting in the queue
+                future.set_result(KModel.Output(audio=torch.from_numpy(audio), pred_dur=torch.from_numpy(pred_dur)))
+            except Exception as e:
+                future.set_exception(e)
+
+        self._executor.submit(_infer, phonemes, voice, speed, backend).add_done_callback(done)
+        return future
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,160 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from metrics import observe
+from mmap_store import MMAP_ENABLED, voice_store
+
+# kokoro (and with it torch) is imported on first use, so importing this module stays cheap
+
+
+class PipelinePool:
+    """Keeps one KPipeline per language code, all sharing a single KModel.
+
+    At most `max_size` pipelines are kept alive; the least recently used language
+    is evicted first. Building a pipeline for one language never blocks requests
+    for a language that is already warm.
+
+    model_factory() can build something other than the KModel for repo_id, e.g.
+    a stand-in that skips the weights; it must be callable the way KModel is.
+    With KOKORO_MMAP on, all pipelines share one dict of memory-mapped voice packs.
+    With a g2p_cache_factory, every pipeline's G2P answers repeated sentences
+    from the G2PCache it returns (or none, for None) when the pipeline is built.
+    """
+
+    def __init__(self, max_size=3, repo_id="hexgrad/Kokoro-82M", device=None, model_factory=None, g2p_cache_factory=None):
+        self.max_size = max_size
+        self.repo_id = repo_id
+        self.device = device
+        self.model_factory = model_factory
+        self.g2p_cache_factory = g2p_cache_factory
+        self._pipelines = OrderedDict()
+        self._lock = threading.Lock()  # Guards _pipelines, _build_locks and the counters
+        self._build_locks = {}
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._build_times = {}
+        self._model_build_time = 0.0
+
+    def get_model(self):
+        """Returns the shared KModel, loading it on first use."""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    start = time.perf_counter()
+                    if self.model_factory:
+                        model = self.model_factory()
+                    else:
+                        from kokoro import KModel
+                        model = KModel(repo_id=self.repo_id)
+                        if self.device:
+                            model = model.to(self.device)
+                        model = model.eval()
+                    self._model = model
+                    self._model_build_time = time.perf_counter() - start
+                    observe("model_load", self._model_build_time)
+        return self._model
+
+    def _build(self, lang_code):
+        from kokoro import KPipeline
+        # KPipeline would load its own KModel for anything that isn't one, so the model is attached afterwards
+        pipeline = KPipeline(lang_code=lang_code, repo_id=self.repo_id, model=False)
+        pipeline.model = self.get_model()
+        if MMAP_ENABLED:
+            pipeline.voices = voice_store(self.repo_id)
+        g2p_cache = self.g2p_cache_factory() if self.g2p_cache_factory else None
+        if g2p_cache is not None:
+            from g2p_cache import CachedG2P
+            pipeline.g2p = CachedG2P(pipeline.g2p, lang_code, g2p_cache)
+        return pipeline
+
+    def get(self, lang_code):
+        """Returns the pipeline for `lang_code`, building it if it is not in the pool."""
+        with self._lock:
+            pipeline = self._pipelines.get(lang_code)
+            if pipeline is not None:
+                self._pipelines.move_to_end(lang_code)
+                self._hits += 1
+                return pipeline
+            build_lock = self._build_locks.setdefault(lang_code, threading.Lock())
+
+        # Only requests for this language wait here while it is being built
+        with build_lock:
+            with self._lock:
+                pipeline = self._pipelines.get(lang_code)
+                if pipeline is not None:
+                    self._pipelines.move_to_end(lang_code)
+                    self._hits += 1
+                    return pipeline
+                self._misses += 1
+
+            start = time.perf_counter()
+            pipeline = self._build(lang_code)
+            elapsed = time.perf_counter() - start
+            observe("pipeline_build", elapsed)
+
+            with self._lock:
+                self._build_times.setdefault(lang_code, []).append(round(elapsed, 3))
+                self._pipelines[lang_code] = pipeline
+                while len(self._pipelines) > self.max_size:
+                    evicted, _ = self._pipelines.popitem(last=False)
+                    self._evictions += 1
+                    print(f"Evicted {evicted} pipeline from the pool")
+        return pipeline
+
+    def stats(self):
+        """Returns hit/miss counters and build times for the pool."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "languages": list(self._pipelines.keys()),
+                "max_size": self.max_size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+                "model_build_time": round(self._model_build_time, 3),
+                "build_times": {lang: list(times) for lang, times in self._build_times.items()},
+            }
+
+
+def segment_from_result(result, with_words=True):
+    """Converts a KPipeline.Result into a plain dict with int16 audio and word timings."""
+    segment = {"text": result.graphemes, "audio": None, "words": []}
+    if result.audio is not None:
+        audio_np = result.audio.numpy()  # Convert Tensor to NumPy array
+        segment["audio"] = (audio_np * 32767).astype(np.int16)  # Scale to 16-bit range
+    if with_words and result.tokens:
+        for t in result.tokens:
+            segment["words"].append({"word": t.text, "start": t.start_ts, "end": t.end_ts})
+    return segment
+
+
+def phonemize(pipeline, text, split_pattern=r'\n+'):
+    """Runs only G2P and chunking, yielding model-less Results chunked exactly as pipeline(text) would."""
+    quiet = copy.copy(pipeline)
+    quiet.model = None
+    yield from quiet(text, split_pattern=split_pattern)
+
+
+def finish_chunk(chunk, output):
+    """Attaches model output to a chunk from phonemize(), filling in its token timestamps."""
+    from kokoro import KPipeline
+    if chunk.tokens and output.pred_dur is not None:
+        KPipeline.join_timestamps(chunk.tokens, output.pred_dur)
+    return KPipeline.Result(graphemes=chunk.graphemes, phonemes=chunk.phonemes, tokens=chunk.tokens,
+                            output=output, text_index=chunk.text_index)
+
+
+def infer_chunk(pipeline, chunk, voice, speed=1, model=None):
+    """Runs the model on one chunk from phonemize() and returns the full KPipeline.Result."""
+    from kokoro import KPipeline
+    model = model or pipeline.model
+    pack = pipeline.load_voice(voice).to(model.device)
+    return finish_chunk(chunk, KPipeline.infer(model, chunk.phonemes, pack, speed))
@@ -22,7 +22,8 @@ def process_tts(title, content):
         voice="af_bella",
         speed=1.0,  # Slightly slower speed to ensure all words are spoken
         translate_text=False,
-        remove_silence=False
+        remove_silence=False,
+        save_to_last=True  # create_final_video.main picks the files up from last/
     )
     
     print(f"\nAudio generated: {audio_path}")
@@ -0,0 +1,67 @@
+"""Compare inference backends against the fp32 torch model.
+
+    python scripts/backend_parity.py --backends torch-int8 onnx onnx-int8
+
+Phonemizes the benchmark corpus, runs every chunk through the torch reference
+and each backend and prints the duration and waveform drift as JSON. The
+reference is also compared with itself, which shows the vocoder's own noise
+floor.
+"""
+import argparse
+import json
+import os
+import sys
+
+kokoro_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(kokoro_dir)
+
+from benchmark import LENGTHS, PARAGRAPHS, VOICES, corpus_text
+
+
+def summarize(results):
+    snrs = [r["snr_db"] for r in results if r["snr_db"] is not None]
+    return {
+        "chunks": len(results),
+        "chunks_with_duration_changes": sum(1 for r in results if r["duration_tokens_changed"] != 0),
+        "max_length_drift_ms": max(abs(r["length_drift_ms"]) for r in results),
+        "min_snr_db": min(snrs) if snrs else None,
+        "mean_snr_db": round(sum(snrs) / len(snrs), 2) if snrs else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure waveform and duration drift of inference backends.")
+    parser.add_argument("--backends", nargs="+", default=["torch-int8", "onnx", "onnx-int8"])
+    parser.add_argument("--language", default="American English", choices=list(PARAGRAPHS))
+    parser.add_argument("--voice", default=None, help="Defaults to the language's first benchmark voice")
+    parser.add_argument("--length", default="medium", choices=list(LENGTHS))
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--details", action="store_true", help="Include per-chunk results")
+    args = parser.parse_args()
+
+    import torch
+    from app import language_map
+    from inference_backends import check_parity, load_backend
+    from pipeline_pool import PipelinePool, phonemize
+
+    repo_id = "hexgrad/Kokoro-82M"
+    voice = args.voice or VOICES[args.language][0]
+    reference = load_backend("torch", repo_id, args.threads)
+    pipeline = PipelinePool(max_size=1, repo_id=repo_id, model_factory=lambda: reference).get(language_map[args.language])
+    pack = pipeline.load_voice(voice)
+    chunks = [chunk.phonemes for chunk in phonemize(pipeline, corpus_text(args.language, args.length)) if chunk.phonemes]
+
+    report = {"language": args.language, "voice": voice, "length": args.length, "backends": {}}
+    for backend in ["torch", *args.backends]:
+        torch.manual_seed(0)
+        model = reference if backend == "torch" else load_backend(backend, repo_id, args.threads)
+        results = check_parity(model, reference, chunks, pack)
+        report["backends"][backend] = {"summary": summarize(results)}
+        if args.details:
+            report["backends"][backend]["chunks"] = results
+        print(f"{backend}: {report['backends'][backend]['summary']}", file=sys.stderr)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
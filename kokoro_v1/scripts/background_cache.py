@@ -0,0 +1,222 @@
+"""Background videos transcoded once to the render profile.
+
+Every file in background_videos/ is converted to 30 fps with a keyframe every
+second and stripped of audio, so renders never convert frame rates and can
+seek anywhere by decoding at most one second of video. Videos keep their own
+size unless KOKORO_VIDEO_WIDTH and KOKORO_VIDEO_HEIGHT ask for a fixed one, in
+which case they are scaled and cropped to it. A manifest records each
+source's hash, mtime, size, duration and keyframe times; only new or changed
+sources are transcoded, on a background thread, so renders never wait for it.
+"""
+import hashlib
+import json
+import os
+import random
+import subprocess
+import threading
+
+# Both unset (the default) keeps every background at its native size
+VIDEO_WIDTH = int(os.environ["KOKORO_VIDEO_WIDTH"]) if os.environ.get("KOKORO_VIDEO_WIDTH") else None
+VIDEO_HEIGHT = int(os.environ["KOKORO_VIDEO_HEIGHT"]) if os.environ.get("KOKORO_VIDEO_HEIGHT") else None
+FPS = 30
+GOP = 30  # Frames between keyframes
+
+
+def file_sha256(path, block_size=1024 * 1024):
+    """Hex sha256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def probe_duration(path):
+    return float(subprocess.run([
+        'ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'csv=p=0', path
+    ], check=True, capture_output=True, text=True).stdout.strip())
+
+
+def probe_keyframes(path):
+    """Returns (duration, keyframe times) of a video without decoding it."""
+    duration = probe_duration(path)
+    packets = subprocess.run([
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', path
+    ], check=True, capture_output=True, text=True).stdout
+    keyframes = []
+    for line in packets.splitlines():
+        pts_time, _, flags = line.partition(",")
+        if "K" in flags and pts_time not in ("", "N/A"):
+            keyframes.append(round(float(pts_time), 3))
+    return duration, sorted(keyframes)
+
+
+class BackgroundCache:
+    """Normalized copies of the videos in source_dir, kept in cache_dir.
+
+    width and height give a fixed output size; with either left out, videos
+    keep their own.
+    """
+
+    def __init__(self, source_dir, cache_dir, width=VIDEO_WIDTH, height=VIDEO_HEIGHT, fps=FPS, gop=GOP):
+        self.source_dir = source_dir
+        self.cache_dir = cache_dir
+        if not (width and height):
+            width = height = None
+        self.profile = {"width": width, "height": height, "fps": fps, "gop": gop}
+        self.manifest_path = os.path.join(cache_dir, "manifest.json")
+        self._lock = threading.Lock()  # Guards manifest, held only briefly
+        self._refresh_lock = threading.Lock()  # One refresh (and transcode) at a time
+        self._refresh_thread = None
+        os.makedirs(cache_dir, exist_ok=True)
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # Entries made for another profile are transcoded again
+        return {name: entry for name, entry in manifest.items() if entry.get("profile") == self.profile}
+
+    def _save_manifest(self):
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"  # Other processes may save at the same time
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _transcode(self, source_path, output_path):
+        width, height = self.profile["width"], self.profile["height"]
+        if width:
+            size = f"scale={width}:{height}:force_original_aspect_ratio=increase,crop={width}:{height}"
+        else:
+            size = "scale=trunc(iw/2)*2:trunc(ih/2)*2"  # Native size, made even for yuv420p
+        # Other processes may transcode the same source, each into its own file; they only ever see a complete one
+        tmp_path = output_path.replace(".mp4", f".{os.getpid()}.{threading.get_ident()}.tmp.mp4")
+        cmd = [
+            'ffmpeg', '-y', '-i', source_path,
+            '-an',  # The speech replaces any background audio
+            '-vf', f"{size},fps={self.profile['fps']},setsar=1",
+            '-c:v', 'libx264', '-crf', '18', '-pix_fmt', 'yuv420p',
+            # Fixed, short GOPs: a keyframe every gop frames and never anywhere else
+            '-g', str(self.profile['gop']), '-keyint_min', str(self.profile['gop']), '-sc_threshold', '0',
+            '-movflags', '+faststart',
+            tmp_path
+        ]
+        try:
+            subprocess.run(cmd, check=True, capture_output=True)
+        except subprocess.CalledProcessError as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise RuntimeError(f"Transcoding {source_path} failed: {e.stderr.decode(errors='replace')[-2000:]}") from e
+        os.replace(tmp_path, output_path)
+
+    def refresh(self):
+        """Brings the cache in line with source_dir and returns the manifest.
+
+        Unchanged sources are recognized by mtime and size without hashing;
+        touched but identical files only get their manifest entry updated.
+        Transcoding happens outside the manifest lock, so pick() keeps serving
+        the entries that are ready meanwhile.
+        """
+        with self._refresh_lock:
+            sources = sorted(f for f in os.listdir(self.source_dir) if f.endswith('.mp4'))
+            for name in sources:
+                source_path = os.path.join(self.source_dir, name)
+                stat = os.stat(source_path)
+                with self._lock:
+                    entry = self.manifest.get(name)
+                if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size \
+                        and os.path.exists(os.path.join(self.cache_dir, entry["file"])):
+                    continue
+
+                sha256 = file_sha256(source_path)
+                # Touched but unchanged sources and copies of another source reuse its file
+                with self._lock:
+                    known = [e for e in self.manifest.values() if e["sha256"] == sha256
+                             and os.path.exists(os.path.join(self.cache_dir, e["file"]))]
+                if known:
+                    entry = known[0]
+                else:
+                    size = f"{self.profile['width']}x{self.profile['height']}" if self.profile["width"] else "native"
+                    file_name = f"{sha256[:16]}_{size}.mp4"
+                    # Files only appear complete, so one found here was made by another process
+                    if not os.path.exists(os.path.join(self.cache_dir, file_name)):
+                        print(f"Normalizing background video {name}...")
+                        self._transcode(source_path, os.path.join(self.cache_dir, file_name))
+                    duration, keyframes = probe_keyframes(os.path.join(self.cache_dir, file_name))
+                    entry = {"file": file_name, "sha256": sha256, "duration": duration,
+                             "keyframes": keyframes, "profile": self.profile}
+                with self._lock:
+                    old = self.manifest.get(name)
+                    if old and old["sha256"] != sha256:
+                        self._release(name)
+                    self.manifest[name] = {**entry, "mtime": stat.st_mtime, "size": stat.st_size}
+                    self._save_manifest()
+
+            with self._lock:
+                deleted = set(self.manifest) - set(sources)
+                for name in deleted:
+                    self._release(name)
+                if deleted:
+                    self._save_manifest()
+                return dict(self.manifest)
+
+    def refresh_async(self):
+        """Starts refresh() on a background thread unless one is already running."""
+        with self._lock:
+            if self._refresh_thread and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(target=self._refresh_logged, name="background-cache", daemon=True)
+            self._refresh_thread.start()
+
+    def _refresh_logged(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Refreshing the background cache failed: {e}")
+
+    def _release(self, name):
+        # Drops a source's entry, and its file unless another source has the same content; needs _lock
+        file_name = self.manifest.pop(name)["file"]
+        if not any(entry["file"] == file_name for entry in self.manifest.values()):
+            try:
+                os.remove(os.path.join(self.cache_dir, file_name))
+            except OSError:
+                pass
+
+    def pick(self):
+        """Returns (path, manifest entry) of a random background, or (None, None) if there is none.
+
+        Only backgrounds that are already normalized are picked, and a refresh
+        is started in the background for new or changed sources. Until the
+        first one is ready, a source is used as it is.
+        """
+        self.refresh_async()
+        with self._lock:
+            ready = {name: entry for name, entry in self.manifest.items()
+                     if os.path.exists(os.path.join(self.cache_dir, entry["file"]))}
+        if ready:
+            entry = ready[random.choice(sorted(ready))]
+            return os.path.join(self.cache_dir, entry["file"]), entry
+        sources = sorted(f for f in os.listdir(self.source_dir) if f.endswith('.mp4'))
+        if not sources:
+            return None, None
+        name = random.choice(sources)
+        path = os.path.join(self.source_dir, name)
+        return path, {"file": name, "duration": probe_duration(path), "keyframes": []}
+
+
+def main():
+    # Normalize every background up front instead of on the first render
+    kokoro_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    cache = BackgroundCache(os.path.join(kokoro_dir, "background_videos"),
+                            os.environ.get("KOKORO_BACKGROUND_CACHE_DIR", os.path.join(kokoro_dir, "background_cache")))
+    for name, entry in cache.refresh().items():
+        print(f"{name}: {entry['file']} ({entry['duration']:.1f}s, {len(entry['keyframes'])} keyframes)")
+
+
+if __name__ == "__main__":
+    main()
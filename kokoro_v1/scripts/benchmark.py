@@ -0,0 +1,336 @@
+"""Synthesis and video pipeline benchmark.
+
+Runs a fixed corpus (short, medium and long texts in every language of
+app.language_map, several voices) through streaming synthesis and
+KOKORO_TTS_API, optionally followed by the video stages, and writes the
+results as JSON:
+
+    python scripts/benchmark.py --threads 4 --output bench.json
+    python scripts/benchmark.py --stub --video   # No model weights needed
+    python scripts/benchmark.py --backends torch torch-int8 onnx onnx-int8
+    python scripts/benchmark.py --batching --lengths short   # Batched vs one-by-one forward passes
+
+Reported per run: real-time factor (synthesis time / audio duration),
+time to first segment, end-to-end KOKORO_TTS_API time and peak RSS (plus
+the final PSS, which only counts a share of memory-mapped pages). The
+audio and segment caches are bypassed so every run really synthesizes.
+With several inference backends, the report also gives each backend's mean
+RTF and its speed-up over the first one. --batching times the chunks of the
+long texts through the model one by one and in padded batches
+(KOKORO_BATCH_WINDOW_MS), the same chunks both ways.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+kokoro_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(kokoro_dir)
+
+# One paragraph per language; "long" repeats it so the text spans several pipeline chunks
+PARAGRAPHS = {
+    "American English": "The river rose quietly through the night. By morning, the old bridge was gone, and the town woke up to a new shoreline. Nobody could remember a flood like it.",
+    "British English": "The shop on the corner has sold the same biscuits for forty years. Every morning the owner unlocks the door at seven sharp. Regulars say the tea is still the best in town.",
+    "Hindi": "नदी रात भर चुपचाप बढ़ती रही। सुबह तक पुराना पुल बह चुका था। किसी को ऐसी बाढ़ याद नहीं थी।",
+    "Spanish": "El río creció en silencio durante la noche. Por la mañana, el viejo puente había desaparecido. Nadie recordaba una inundación así.",
+    "French": "La rivière a monté doucement pendant la nuit. Au matin, le vieux pont avait disparu. Personne ne se souvenait d'une telle crue.",
+    "Italian": "Il fiume è salito in silenzio durante la notte. Al mattino, il vecchio ponte non c'era più. Nessuno ricordava un'alluvione simile.",
+    "Brazilian Portuguese": "O rio subiu em silêncio durante a noite. De manhã, a velha ponte tinha desaparecido. Ninguém se lembrava de uma enchente assim.",
+    "Japanese": "川は夜の間に静かに水かさを増した。朝になると、古い橋はなくなっていた。誰もそんな洪水を覚えていなかった。",
+    "Mandarin Chinese": "河水在夜里悄悄上涨。到了早上，那座老桥已经不见了。没有人记得有过这样的洪水。",
+}
+LENGTHS = {"short": 0, "medium": 1, "long": 8}  # Paragraph repetitions; 0 means the first sentence only
+VOICES = {
+    "American English": ["af_bella", "af_heart", "am_adam"],
+    "British English": ["bf_isabella", "bm_george"],
+    "Hindi": ["hf_alpha"],
+    "Spanish": ["ef_dora"],
+    "French": ["ff_siwis"],
+    "Italian": ["if_sara"],
+    "Brazilian Portuguese": ["pf_dora"],
+    "Japanese": ["jf_nezumi"],
+    "Mandarin Chinese": ["zf_xiaoni"],
+}
+
+
+def corpus_text(language, length):
+    paragraph = PARAGRAPHS[language]
+    repeats = LENGTHS[length]
+    if repeats == 0:
+        for end in (". ", "。", "। "):
+            if end in paragraph:
+                return paragraph.split(end)[0] + end.strip()
+        return paragraph
+    return "\n\n".join([paragraph] * repeats)
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def pss_mb():
+    # Proportional set size: pages shared with other processes (memory-mapped weights and voices) count only in part
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+class StubModel:
+    """Stands in for KModel without any weights: every phoneme lasts a few frames of a quiet tone.
+
+    Only the model is replaced, so G2P, chunking, timestamps, silence removal,
+    caching and file writing are measured as usual.
+    """
+
+    device = "cpu"
+
+    def __init__(self, frames_per_phoneme=3):
+        self.frames_per_phoneme = frames_per_phoneme
+
+    def __call__(self, phonemes, ref_s, speed=1, return_output=False):
+        import torch
+        from kokoro import KModel
+        frames = max(1, round(self.frames_per_phoneme / speed))
+        pred_dur = torch.full((len(phonemes) + 2,), frames, dtype=torch.long)  # Including the BOS/EOS tokens
+        t = torch.arange(int(pred_dur.sum()) * 600) / 24000  # 600 samples per frame
+        audio = 0.1 * torch.sin(2 * math.pi * 220 * t)
+        return KModel.Output(audio=audio, pred_dur=pred_dur) if return_output else audio
+
+
+def bench_synthesis(app, language, voice, length, skip_api=False, backend=None):
+    text = corpus_text(language, length)
+    start = time.perf_counter()
+    first_segment = None
+    segments = 0
+    samples = 0
+    for segment in app.stream_segments(text, Language=language, voice=voice, backend=backend):
+        if first_segment is None:
+            first_segment = time.perf_counter() - start
+        segments += 1
+        samples += len(segment["audio"])
+    synth_seconds = time.perf_counter() - start
+    audio_seconds = samples / app.SAMPLE_RATE
+
+    result = {
+        "language": language,
+        "voice": voice,
+        "length": length,
+        "backend": backend,
+        "chars": len(text),
+        "segments": segments,
+        "audio_seconds": round(audio_seconds, 3),
+        "synth_seconds": round(synth_seconds, 3),
+        "rtf": round(synth_seconds / audio_seconds, 4) if audio_seconds else None,
+        "ttfs": round(first_segment, 3) if first_segment is not None else None,
+    }
+    if not skip_api:
+        start = time.perf_counter()
+        save_path, _, *side_files = app.KOKORO_TTS_API(text, Language=language, voice=voice, backend=backend)
+        result["api_seconds"] = round(time.perf_counter() - start, 3)
+        for path in [save_path, *side_files]:
+            if path:
+                os.remove(path)
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def bench_video(length, render_backend):
+    from orchestrator import JobContext, VIDEO_STAGES, run_stages
+    language = "American English"
+    ctx = JobContext(f"Benchmark {length}", corpus_text(language, length), Language=language,
+                     render_backend=render_backend)
+    with ctx.workspace:
+        start = time.perf_counter()
+        run_stages(ctx, VIDEO_STAGES)
+        total = time.perf_counter() - start
+    return {
+        "length": length,
+        "render_backend": render_backend,
+        "duration": round(ctx.artifacts["duration"], 3),
+        "total_seconds": round(total, 3),
+        "timings": ctx.timings,
+        "parts": len(ctx.artifacts["parts"]),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def bench_batching(app, language, voice, batch_size):
+    """Seconds to run the chunks of the long text through the model one by one and batch_size at a time."""
+    import torch
+    from batching import batched_forward
+    from inference_backends import tokenize
+    from pipeline_pool import phonemize
+    pipeline = app.update_pipeline(language)
+    model = app.pipeline_pool.get_model()
+    model = getattr(model, "model", model)  # The KModel inside a BatchingModel
+    pack = pipeline.load_voice(voice)
+    phonemes = [chunk.phonemes for chunk in phonemize(pipeline, corpus_text(language, "long")) if chunk.phonemes]
+    token_lists = [tokenize(model.vocab, model.context_length, ps) for ps in phonemes]
+    ref_s = torch.cat([pack[len(ps) - 1].reshape(1, -1) for ps in phonemes]).to(model.device)
+    with torch.no_grad():
+        start = time.perf_counter()
+        for tokens, style in zip(token_lists, ref_s):
+            model.forward_with_tokens(torch.LongTensor([tokens]).to(model.device), style.unsqueeze(0))
+        sequential = time.perf_counter() - start
+        start = time.perf_counter()
+        for i in range(0, len(token_lists), batch_size):
+            batched_forward(model, token_lists[i:i + batch_size], ref_s[i:i + batch_size])
+        batched = time.perf_counter() - start
+    return {
+        "language": language,
+        "voice": voice,
+        "chunks": len(token_lists),
+        "batch_size": batch_size,
+        "sequential_seconds": round(sequential, 3),
+        "batched_seconds": round(batched, 3),
+        "speedup": round(sequential / batched, 3) if batched else None,
+    }
+
+
+def backend_summary(results, backends):
+    """Mean RTF per backend and its speed-up over the first backend."""
+    summary = {}
+    for backend in backends:
+        rtfs = [r["rtf"] for r in results if r["backend"] == backend and r["rtf"]]
+        summary[backend] = {"runs": len(rtfs), "mean_rtf": round(sum(rtfs) / len(rtfs), 4) if rtfs else None}
+    baseline = summary[backends[0]]["mean_rtf"]
+    for values in summary.values():
+        values["rtf_gain"] = round(baseline / values["mean_rtf"], 2) if baseline and values["mean_rtf"] else None
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=kokoro_dir, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark synthesis and the video stages.")
+    parser.add_argument("--languages", nargs="+", default=list(PARAGRAPHS), help="Languages to run (default: all)")
+    parser.add_argument("--lengths", nargs="+", default=list(LENGTHS), choices=list(LENGTHS))
+    parser.add_argument("--voices", type=int, default=None, help="At most this many voices per language")
+    parser.add_argument("--threads", type=int, default=None, help="Torch intra-op threads (also OMP/MKL threads)")
+    parser.add_argument("--backends", nargs="+", default=None, choices=["torch", "torch-int8", "onnx", "onnx-int8"],
+                        help="Inference backends to compare, the first one is the baseline (default: KOKORO_BACKEND)")
+    parser.add_argument("--stub", action="store_true", help="Replace the model with a stub, no weights are downloaded")
+    parser.add_argument("--g2p-cache", action="store_true",
+                        help="Keep the G2P cache on; by default every run pays for G2P as a new article would")
+    parser.add_argument("--skip-api", action="store_true", help="Only measure streaming synthesis, not KOKORO_TTS_API")
+    parser.add_argument("--video", action="store_true", help="Also run the video stages (needs ffmpeg and a background video)")
+    parser.add_argument("--batching", action="store_true",
+                        help="Also compare one-by-one and batched forward passes on the long texts")
+    parser.add_argument("--render-backend", default="ffmpeg", choices=["moviepy", "ffmpeg"])
+    parser.add_argument("--output", default=None, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    if args.stub and args.backends:
+        parser.error("--stub replaces the model, it can't be combined with --backends")
+    if args.stub and args.batching:
+        parser.error("--batching needs the real model, it can't be combined with --stub")
+
+    if args.threads:
+        # Must be set before torch is imported to take effect for OpenMP/MKL
+        os.environ["OMP_NUM_THREADS"] = os.environ["MKL_NUM_THREADS"] = str(args.threads)
+
+    import app
+    backends = args.backends or [app.INFERENCE_BACKEND]
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+    if args.stub:
+        app.pipeline_pool.model_factory = StubModel
+        app.TTS_WORKERS = 0  # Worker processes would load the real model
+    # Measure synthesis, not cache lookups
+    app.get_audio_cache().enabled = False
+    app.get_segment_cache().enabled = False
+    if app.get_g2p_cache() and not args.g2p_cache:
+        app.get_g2p_cache().enabled = False  # The corpus repeats paragraphs and every voice reruns the same texts
+
+    report = {
+        "meta": {
+            "started_at": datetime.now().isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "threads": args.threads,
+            "stub_model": args.stub,
+            "g2p_cache": bool(app.get_g2p_cache() and app.get_g2p_cache().enabled),
+            "backends": backends,
+        },
+        "synthesis": [],
+        "batching": [],
+        "video": [],
+    }
+
+    for language in args.languages:
+        voices = VOICES[language][:args.voices] if args.voices else VOICES[language]
+        # Build the pipeline (and the model) outside the measurements
+        start = time.perf_counter()
+        pipeline = app.update_pipeline(language)
+        build_seconds = round(time.perf_counter() - start, 3)
+        for voice in voices:
+            if args.stub:
+                import torch
+                pipeline.voices[voice] = torch.zeros(510, 1, 256)  # Never downloaded
+            else:
+                pipeline.load_voice(voice)
+            for backend in backends:
+                app.get_backend_model(backend)  # Load (and export) outside the measurements
+                for length in args.lengths:
+                    result = bench_synthesis(app, language, voice, length, skip_api=args.skip_api, backend=backend)
+                    result["pipeline_build_seconds"] = build_seconds
+                    print(f"{language} / {voice} / {backend} / {length}: RTF {result['rtf']}, TTFS {result['ttfs']}s",
+                          file=sys.stderr)
+                    report["synthesis"].append(result)
+
+    if args.batching:
+        for language in args.languages:
+            voice = VOICES[language][0]
+            result = bench_batching(app, language, voice, app.BATCH_MAX_SIZE)
+            print(f"batching / {language}: {result['sequential_seconds']}s one by one, "
+                  f"{result['batched_seconds']}s batched ({result['speedup']}x)", file=sys.stderr)
+            report["batching"].append(result)
+
+    if args.video:
+        from orchestrator import background_cache
+        background_cache.refresh()  # Transcoding new backgrounds is not part of the measurements
+        if args.stub:
+            import torch
+            app.update_pipeline("American English").voices["af_bella"] = torch.zeros(510, 1, 256)
+        for length in args.lengths:
+            result = bench_video(length, args.render_backend)
+            print(f"video / {length}: {result['total_seconds']}s {result['timings']}", file=sys.stderr)
+            report["video"].append(result)
+
+    report["backends"] = backend_summary(report["synthesis"], backends)
+    report["meta"]["peak_rss_mb"] = peak_rss_mb()
+    report["meta"]["pss_mb"] = pss_mb()
+    report["pipelines"] = app.pipeline_pool.stats()
+    report["g2p_cache"] = app.get_g2p_cache().stats() if app.get_g2p_cache() else None
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+        print(f"Report written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,69 +1,56 @@
 import os
-from moviepy.editor import VideoFileClip, AudioFileClip, TextClip, CompositeVideoClip
 import pysrt
 from datetime import datetime
-import random
+
+try:
+    from subtitle_renderer import SubtitleTrack
+    from background_cache import BackgroundCache
+except ImportError:  # Imported as scripts.create_final_video
+    from scripts.subtitle_renderer import SubtitleTrack
+    from scripts.background_cache import BackgroundCache
 
 def time_to_seconds(time_obj):
     """Convert SRT time object to seconds."""
     return time_obj.hours * 3600 + time_obj.minutes * 60 + time_obj.seconds + time_obj.milliseconds / 1000
 
-def create_subtitle_clips(video_width, video_height, subtitles):
-    """Create TextClips for each subtitle."""
-    text_clips = []
-    
-    for subtitle in subtitles:
-        start_time = time_to_seconds(subtitle.start)
-        end_time = time_to_seconds(subtitle.end)
-        duration = end_time - start_time
-        
-        # Create text clip
-        text_clip = (TextClip(subtitle.text, 
-                             fontsize=70,
-                             color='yellow',
-                             font='Arial-Bold',
-                             stroke_color='black',
-                             stroke_width=2,
-                             size=(video_width * 0.8, None),  # Limit width to 80% of video width
-                             method='caption')
-                    .set_position(('center', 'center'))
-                    .set_duration(duration)
-                    .set_start(start_time))
-        
-        text_clips.append(text_clip)
-    
-    return text_clips
+def load_srt_cues(srt_path):
+    """Read an SRT file into a list of (start, end, text) cues in seconds."""
+    return [(time_to_seconds(subtitle.start), time_to_seconds(subtitle.end), subtitle.text)
+            for subtitle in pysrt.open(srt_path)]
 
-def create_final_video(background_video_path, audio_path, srt_path, output_path):
-    """Create final video with background, audio, and subtitles."""
+def render_video(background_video_path, audio, cues, output_path, background_offset=0, duration=None, threads=None,
+                 keyframes=None):
+    """Render background, an AudioClip and (start, end, text) cues into output_path.
+
+    With audio=None a video-only file of `duration` seconds is written. The
+    background starts background_offset seconds in and loops from its beginning.
+    Keyframes are forced at the given times so the video can be split there.
+    """
+    from moviepy.editor import VideoFileClip  # Importing MoviePy is slow, only pay for it when rendering with it
     print("Loading background video...")
     background = VideoFileClip(background_video_path)
     
-    print("Loading audio file...")
-    audio = AudioFileClip(audio_path)
-    
-    print("Loading subtitles...")
-    subtitles = pysrt.open(srt_path)
-    
     # Calculate required video duration
-    video_duration = audio.duration
+    video_duration = audio.duration if audio is not None else duration
     
     # Loop background video if needed
-    if background.duration < video_duration:
-        background = background.loop(duration=video_duration)
+    if background_offset or background.duration < video_duration:
+        background_duration = background.duration
+        background = background.fl_time(lambda t: (t + background_offset) % background_duration).set_duration(video_duration)
     else:
         background = background.subclip(0, video_duration)
     
     # Set audio
-    background = background.set_audio(audio)
+    background = background.set_audio(audio) if audio is not None else background.without_audio()
     
-    # Create subtitle clips
-    print("Creating subtitle clips...")
-    subtitle_clips = create_subtitle_clips(background.w, background.h, subtitles)
+    # Index the subtitles by time and rasterize each caption once
+    print("Preparing subtitles...")
+    track = SubtitleTrack(cues, background.w, background.h, fontsize=70, color='yellow', stroke_color='black', stroke_width=2)
+    track.prerender()
     
-    # Combine everything
+    # Each frame only blends the one or two captions active at that moment
     print("Compositing final video...")
-    final_video = CompositeVideoClip([background] + subtitle_clips)
+    final_video = background.fl(lambda get_frame, t: track.blend(get_frame(t), t))
     
     # Create output directory if it doesn't exist
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
@@ -74,17 +61,33 @@ def create_final_video(background_video_path, audio_path, srt_path, output_path)
         output_path,
         fps=30,
         codec='libx264',
+        audio=audio is not None,
         audio_codec='aac',
-        temp_audiofile="temp-audio.m4a",
-        remove_temp=True
+        temp_audiofile=output_path.replace(".mp4", "-temp-audio.m4a"),  # One per output so concurrent renders don't clash
+        remove_temp=True,
+        threads=threads,
+        ffmpeg_params=['-force_key_frames', ",".join(f"{t:.3f}" for t in keyframes)] if keyframes else None
     )
     
     # Clean up
     background.close()
-    audio.close()
+    if audio is not None:
+        audio.close()
     final_video.close()
     
     print(f"Video created successfully: {output_path}")
+    return output_path
+
+def create_final_video(background_video_path, audio_path, srt_path, output_path):
+    """Create final video with background, audio, and subtitles."""
+    from moviepy.editor import AudioFileClip
+    print("Loading audio file...")
+    audio = AudioFileClip(audio_path)
+    
+    print("Loading subtitles...")
+    cues = load_srt_cues(srt_path)
+    
+    return render_video(background_video_path, audio, cues, output_path)
 
 def main():
     # Define paths - now accounting for scripts directory
@@ -108,18 +111,18 @@ def main():
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     output_path = os.path.join(output_dir, f"final_video_{timestamp}.mp4")
     
-    # Get background video path and randomly select one
+    # Get background video path and randomly select one, normalizing new ones first
     background_video_dir = os.path.join(kokoro_dir, "background_videos")
-    background_videos = [f for f in os.listdir(background_video_dir) if f.endswith('.mp4')]
+    background_cache = BackgroundCache(background_video_dir,
+                                       os.environ.get("KOKORO_BACKGROUND_CACHE_DIR", os.path.join(kokoro_dir, "background_cache")))
+    background_cache.refresh()  # A one-off run can wait for the transcode, renders in the API do not
+    background_video_path, background = background_cache.pick()
     
-    if not background_videos:
+    if not background_video_path:
         print(f"Error: No background videos found in {background_video_dir}")
         return
     
-    # Randomly select a background video
-    selected_video = random.choice(background_videos)
-    background_video_path = os.path.join(background_video_dir, selected_video)
-    print(f"Selected background video: {selected_video}")
+    print(f"Selected background video: {background['file']}")
     
     # Create final video
     create_final_video(background_video_path, audio_path, srt_path, output_path)
@@ -0,0 +1,127 @@
+"""Render the final video with a single ffmpeg invocation.
+
+Subtitles are written as an ASS file and burned in by libass, the background is
+looped with -stream_loop and the speech is fed as the audio track, so no video
+frame ever passes through Python.
+"""
+import json
+import os
+import subprocess
+
+import numpy as np
+
+FPS = 30
+
+
+def probe_video(path):
+    """Returns (width, height, duration) of the first video stream."""
+    result = subprocess.run([
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'stream=width,height:format=duration',
+        '-of', 'json', path
+    ], check=True, capture_output=True, text=True)
+    info = json.loads(result.stdout)
+    stream = info['streams'][0]
+    return stream['width'], stream['height'], float(info['format']['duration'])
+
+
+def format_ass_time(seconds):
+    """ASS timestamps are H:MM:SS.cc (centiseconds)."""
+    centiseconds = int(round(max(seconds, 0) * 100))
+    hours, centiseconds = divmod(centiseconds, 360000)
+    minutes, centiseconds = divmod(centiseconds, 6000)
+    secs, centiseconds = divmod(centiseconds, 100)
+    return f"{hours}:{minutes:02}:{secs:02}.{centiseconds:02}"
+
+
+def ass_color(red, green, blue):
+    """ASS colours are &HAABBGGRR with alpha 00 meaning opaque."""
+    return f"&H00{blue:02X}{green:02X}{red:02X}"
+
+
+def write_ass(cues, output_file, video_width, video_height, fontsize=70, font="Arial"):
+    """Write (start, end, text) cues as an ASS file laid out like the MoviePy renderer.
+
+    Centered yellow bold text with a 2px black outline, wrapped at 80% of the
+    video width.
+    """
+    margin = int(video_width * 0.1)  # 10% on each side leaves 80% for the text
+    header = f"""[Script Info]
+ScriptType: v4.00+
+PlayResX: {video_width}
+PlayResY: {video_height}
+WrapStyle: 0
+ScaledBorderAndShadow: yes
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Default,{font},{fontsize},{ass_color(255, 255, 0)},{ass_color(255, 255, 0)},{ass_color(0, 0, 0)},{ass_color(0, 0, 0)},-1,0,0,0,100,100,0,0,1,2,0,5,{margin},{margin},0,1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+"""
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write(header)
+        for start, end, text in cues:
+            # Braces would start an override block, newlines need ASS's own marker
+            text = text.replace("{", "(").replace("}", ")").replace("\n", "\\N")
+            f.write(f"Dialogue: 0,{format_ass_time(start)},{format_ass_time(end)},Default,,0,0,0,,{text}\n")
+    return output_file
+
+
+def render_video_ffmpeg(background_video_path, audio, cues, output_path, sample_rate=24000,
+                        background_offset=0, duration=None, threads=None, keyframes=None):
+    """Render background, audio and (start, end, text) cues into output_path with one ffmpeg run.
+
+    audio is either the path of a WAV file or an int16 mono buffer, which is
+    piped to ffmpeg instead of being written to disk. With audio=None a silent,
+    video-only file of `duration` seconds is written instead. The background
+    starts background_offset seconds in and loops from its beginning, and
+    keyframes are forced at the given times so the video can be split there.
+    """
+    video_width, video_height, _ = probe_video(background_video_path)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    ass_path = output_path.replace(".mp4", ".ass")
+    write_ass(cues, ass_path, video_width, video_height)
+
+    audio_bytes = None
+    if audio is None:
+        audio_input = []
+        # An exact frame count, so slices rendered separately line up when joined
+        audio_output = ['-frames:v', str(int(round(duration * FPS))), '-an']
+    elif isinstance(audio, np.ndarray):
+        duration = len(audio) / sample_rate
+        audio_input = ['-f', 's16le', '-ar', str(sample_rate), '-ac', '1', '-i', 'pipe:0']
+        audio_output = ['-map', '1:a', '-t', f"{duration:.3f}", '-c:a', 'aac']
+        audio_bytes = audio.astype(np.int16).tobytes()
+    else:
+        duration = float(subprocess.run([
+            'ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'csv=p=0', audio
+        ], check=True, capture_output=True, text=True).stdout.strip())
+        audio_input = ['-i', os.path.abspath(audio)]
+        audio_output = ['-map', '1:a', '-t', f"{duration:.3f}", '-c:a', 'aac']
+
+    cmd = [
+        'ffmpeg', '-y',
+        '-ss', f"{background_offset:.3f}",
+        '-stream_loop', '-1', '-i', os.path.abspath(background_video_path),  # Loop the background as long as needed
+        *audio_input,
+        # The ASS file is referenced relative to cwd, which avoids filtergraph path escaping
+        '-filter_complex', f"[0:v]fps={FPS},ass={os.path.basename(ass_path)}[v]",
+        '-map', '[v]',
+        *audio_output,
+        '-c:v', 'libx264', '-pix_fmt', 'yuv420p',
+        *(['-force_key_frames', ",".join(f"{t:.3f}" for t in keyframes)] if keyframes else []),
+        *(['-threads', str(threads)] if threads else []),
+        os.path.abspath(output_path)
+    ]
+    print("Rendering final video with ffmpeg...")
+    try:
+        subprocess.run(cmd, input=audio_bytes, check=True, capture_output=True,
+                       cwd=os.path.dirname(os.path.abspath(ass_path)))
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"ffmpeg render failed: {e.stderr.decode(errors='replace')[-2000:]}") from e
+    finally:
+        os.remove(ass_path)
+    print(f"Video created successfully: {output_path}")
+    return output_path
@@ -38,6 +38,7 @@ def format_text_to_json():
         f.write(formatted_json)
     
     print(f"\nJSON has been formatted and saved to {json_path}")
+    return json_data
 
 if __name__ == "__main__":
     format_text_to_json() 
\ No newline at end of file
@@ -0,0 +1,152 @@
+"""Render long videos as time slices in parallel and join them without re-encoding.
+
+The timeline is cut where no subtitle is on screen, snapped to frame
+boundaries. Every slice is encoded as a video-only file by its own worker
+process, starting the background at the matching offset, and the slices are
+then joined with ffmpeg's concat demuxer (-c:v copy). The audio is encoded
+once over the whole timeline while joining, so AAC priming never shows up at
+slice boundaries.
+"""
+import math
+import multiprocessing
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+
+import numpy as np
+
+FPS = 30
+MIN_SLICE_SECONDS = 30  # Shorter slices spend more time starting up than encoding
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_render_pool(workers):
+    """Process pool shared by every render, started on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def plan_slices(cues, duration, n_slices, fps=FPS):
+    """Cuts [0, duration] into up to n_slices (start_frame, end_frame) ranges.
+
+    Cuts are placed at the cue start closest to an even split that no earlier
+    cue still covers, so no caption is split across two slices.
+    """
+    total_frames = int(math.ceil(duration * fps))
+    candidates = []
+    covered_until = 0
+    for start, end, _ in sorted(cues):
+        if start >= covered_until:
+            candidates.append(int(round(start * fps)))
+        covered_until = max(covered_until, end)
+    candidates = sorted(set(frame for frame in candidates if 0 < frame < total_frames))
+
+    cuts = [0]
+    for k in range(1, n_slices):
+        target = total_frames * k // n_slices
+        later = [frame for frame in candidates if frame > cuts[-1]]
+        cut = min(later, key=lambda frame: abs(frame - target)) if later else target
+        if cuts[-1] < cut < total_frames:
+            cuts.append(cut)
+    cuts.append(total_frames)
+    return list(zip(cuts[:-1], cuts[1:]))
+
+
+def slice_cues(cues, start, end):
+    """Cues overlapping [start, end), clipped to it and shifted to start at 0."""
+    return [(max(cue_start, start) - start, min(cue_end, end) - start, text)
+            for cue_start, cue_end, text in cues if cue_end > start and cue_start < end]
+
+
+def _render_slice(backend, background_video_path, background_offset, frames, cues, output_path, threads, keyframes):
+    # Runs in a worker process
+    if backend == "ffmpeg":
+        try:
+            from ffmpeg_render import render_video_ffmpeg
+        except ImportError:  # Imported as scripts.parallel_render
+            from scripts.ffmpeg_render import render_video_ffmpeg
+        return render_video_ffmpeg(background_video_path, None, cues, output_path, background_offset=background_offset,
+                                   duration=frames / FPS, threads=threads, keyframes=keyframes)
+    try:
+        from create_final_video import render_video
+    except ImportError:
+        from scripts.create_final_video import render_video
+    # MoviePy writes int(duration * fps) frames, half a frame extra keeps float error from dropping one
+    return render_video(background_video_path, None, cues, output_path, background_offset=background_offset,
+                        duration=(frames + 0.5) / FPS, threads=threads, keyframes=keyframes)
+
+
+def concat_slices(slice_paths, audio, output_path, sample_rate=24000):
+    """Join video-only slices losslessly and mux the int16 audio buffer over them."""
+    list_path = output_path.replace(".mp4", "-slices.txt")
+    with open(list_path, "w", encoding="utf-8") as f:
+        for path in slice_paths:
+            f.write(f"file '{os.path.abspath(path)}'\n")
+    cmd = [
+        'ffmpeg', '-y',
+        '-f', 'concat', '-safe', '0', '-i', list_path,
+        '-f', 's16le', '-ar', str(sample_rate), '-ac', '1', '-i', 'pipe:0',
+        '-map', '0:v', '-map', '1:a',
+        '-c:v', 'copy', '-c:a', 'aac',
+        '-t', f"{len(audio) / sample_rate:.3f}",
+        output_path
+    ]
+    try:
+        subprocess.run(cmd, input=audio.astype(np.int16).tobytes(), check=True, capture_output=True)
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"ffmpeg concat failed: {e.stderr.decode(errors='replace')[-2000:]}") from e
+    finally:
+        os.remove(list_path)
+    return output_path
+
+
+def render_video_parallel(background_video_path, audio, cues, output_path, backend="moviepy", workers=2, sample_rate=24000,
+                          keyframes=None, background_duration=None):
+    """Render like render_video/render_video_ffmpeg, but as up to `workers` slices encoded concurrently.
+
+    audio is an int16 mono buffer; cues are (start, end, text) in seconds and
+    keyframes are forced at the given times. background_duration is probed
+    when not given.
+    """
+    keyframes = keyframes or []
+    if background_duration is None:
+        try:
+            from ffmpeg_render import probe_video
+        except ImportError:
+            from scripts.ffmpeg_render import probe_video
+        _, _, background_duration = probe_video(background_video_path)
+    duration = len(audio) / sample_rate
+    n_slices = max(1, min(workers, int(duration // MIN_SLICE_SECONDS)))
+    slices = plan_slices(cues, duration, n_slices)
+    threads = max(1, (os.cpu_count() or 1) // len(slices))  # Split the encoder threads between slices
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    slice_dir = output_path.replace(".mp4", "-slices")
+    os.makedirs(slice_dir, exist_ok=True)
+    print(f"Rendering {len(slices)} slices in parallel...")
+    try:
+        pool = get_render_pool(workers)
+        futures = []
+        for i, (start_frame, end_frame) in enumerate(slices):
+            start, end = start_frame / FPS, end_frame / FPS
+            futures.append(pool.submit(
+                _render_slice, backend, background_video_path, start % background_duration,
+                end_frame - start_frame, slice_cues(cues, start, end),
+                os.path.join(slice_dir, f"slice_{i:03d}.mp4"), threads,
+                [t - start for t in keyframes if start < t < end]  # Every slice already starts on a keyframe
+            ))
+        wait(futures)  # Let every slice finish before the directory can be removed
+        slice_paths = [future.result() for future in futures]
+        print("Joining slices...")
+        concat_slices(slice_paths, audio, output_path, sample_rate=sample_rate)
+    finally:
+        shutil.rmtree(slice_dir, ignore_errors=True)
+    print(f"Video created successfully: {output_path}")
+    return output_path
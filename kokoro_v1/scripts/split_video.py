@@ -1,55 +1,84 @@
 import os
 import subprocess
-from moviepy.editor import VideoFileClip
+import tempfile
 
-def split_video(input_path, segment_duration=120):  # 120 seconds = 2 minutes
-    """Split a video into segments of specified duration using FFmpeg."""
-    print(f"Loading video: {input_path}")
-    video = VideoFileClip(input_path)
-    
-    # Get video duration
-    total_duration = video.duration
-    video.close()  # Close the video file as we'll use FFmpeg directly
-    print(f"Total duration: {total_duration:.2f} seconds")
-    
-    # Calculate number of segments
-    num_segments = int(total_duration // segment_duration) + (1 if total_duration % segment_duration > 0 else 0)
-    print(f"Splitting into {num_segments} segments...")
+def probe_duration(path):
+    """Duration of a media file in seconds, read by ffprobe from the container header."""
+    result = subprocess.run([
+        'ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'csv=p=0', path
+    ], check=True, capture_output=True, text=True)
+    return float(result.stdout.strip())
+
+def plan_split_points(duration, segment_duration=120, sentence_ends=(), min_fraction=0.75):
+    """Times at which to cut a video of `duration` seconds into parts of at most segment_duration.
+
+    Each cut goes at the last sentence end that keeps the part between
+    min_fraction * segment_duration and segment_duration long, or exactly at
+    segment_duration when no sentence ends in that window.
+    """
+    sentence_ends = sorted(sentence_ends)
+    points = []
+    last = 0
+    while duration - last > segment_duration:
+        window = [t for t in sentence_ends if last + segment_duration * min_fraction <= t <= last + segment_duration]
+        last = round(window[-1] if window else last + segment_duration, 3)
+        points.append(last)
+    return points
+
+def split_video(input_path, segment_duration=120, split_points=None, duration=None, on_part=None):  # 120 seconds = 2 minutes
+    """Split a video into parts at split_points with one stream-copying FFmpeg pass.
+
+    Without split_points the video is cut every segment_duration seconds. The
+    segment muxer cuts at the first keyframe at or after each point, so videos
+    rendered with keyframes forced at split_points are cut exactly there.
+    on_part(path) is called as soon as each part has been written, while the
+    following parts are still being cut.
+    """
+    if split_points is None:
+        if duration is None:
+            duration = probe_duration(input_path)
+        print(f"Total duration: {duration:.2f} seconds")
+        split_points = plan_split_points(duration, segment_duration)
+    if not split_points:
+        print("Video is shorter than one segment, nothing to split")
+        return []
+    print(f"Splitting into {len(split_points) + 1} segments...")
     
     # Use the same directory as the input video
     output_dir = os.path.dirname(input_path)
     
     # Get base filename without extension
     base_name = os.path.splitext(os.path.basename(input_path))[0]
+    output_pattern = os.path.join(output_dir, f"{base_name}_part%d.mp4")
     
-    # Split video into segments using FFmpeg
+    cmd = [
+        'ffmpeg', '-y',  # Overwrite output files
+        '-loglevel', 'error',  # Keep stderr short, it only matters when ffmpeg fails
+        '-i', input_path,  # Input file
+        '-map', '0',
+        '-c', 'copy',  # Copy audio and video (no re-encoding)
+        '-f', 'segment',
+        '-segment_times', ",".join(f"{t:.3f}" for t in split_points),
+        '-reset_timestamps', '1',  # Every part starts at 0
+        '-segment_start_number', '1',
+        # The muxer lists every part on stdout once it is complete
+        '-segment_list', 'pipe:1', '-segment_list_type', 'flat',
+        output_pattern
+    ]
     output_paths = []
-    for i in range(num_segments):
-        start_time = i * segment_duration
-        duration = min(segment_duration, total_duration - start_time)
-        
-        # Generate output path
-        output_path = os.path.join(output_dir, f"{base_name}_part{i+1}.mp4")
-        
-        # FFmpeg command to split video with audio
-        print(f"Writing segment {i+1}/{num_segments}...")
-        cmd = [
-            'ffmpeg', '-y',  # Overwrite output files
-            '-i', input_path,  # Input file
-            '-ss', str(start_time),  # Start time
-            '-t', str(duration),  # Duration
-            '-c:v', 'copy',  # Copy video codec (no re-encoding)
-            '-c:a', 'copy',  # Copy audio codec (no re-encoding)
-            output_path
-        ]
-        
-        # Run FFmpeg command
-        try:
-            subprocess.run(cmd, check=True, capture_output=True)
+    # stderr goes to a file: a pipe nobody reads until stdout closes can fill up and stall ffmpeg
+    with tempfile.TemporaryFile(mode='w+') as stderr:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr, text=True)
+        for line in process.stdout:
+            if not line.strip():
+                continue
+            output_path = os.path.join(output_dir, os.path.basename(line.strip()))
             output_paths.append(output_path)
-        except subprocess.CalledProcessError as e:
-            print(f"Error processing segment {i+1}: {e}")
-            continue
+            if on_part:
+                on_part(output_path)
+        if process.wait() != 0:
+            stderr.seek(0)
+            raise RuntimeError(f"ffmpeg split failed: {stderr.read()[-2000:]}")
     
     print(f"Split complete! {len(output_paths)} segments created in {output_dir}")
     return output_paths
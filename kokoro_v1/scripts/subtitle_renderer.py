@@ -0,0 +1,141 @@
+"""Rasterizes subtitle captions in-process with Pillow and caches the overlays.
+
+Each distinct caption (text and style) is drawn once; the resulting RGB and
+alpha arrays are read-only and shared by every frame and every job that shows
+the same caption.
+"""
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# Tried in order; Pillow also searches the system font directories for bare file names
+FONT_CANDIDATES = [
+    "Arial Bold.ttf",
+    "arialbd.ttf",
+    "Arial-Bold.ttf",
+    "DejaVuSans-Bold.ttf",
+    "LiberationSans-Bold.ttf",
+]
+CAPTION_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=None)
+def load_font(fontsize):
+    """Returns the first available bold font at fontsize."""
+    for name in FONT_CANDIDATES:
+        try:
+            return ImageFont.truetype(name, fontsize)
+        except OSError:
+            continue
+    print("Warning: no bold TrueType font found, using Pillow's default font")
+    return ImageFont.load_default(fontsize)
+
+
+def wrap_text(text, font, max_width, stroke_width=0):
+    """Greedy word wrap so that no line is wider than max_width pixels."""
+    lines = []
+    line = ""
+    for word in text.split():
+        candidate = f"{line} {word}" if line else word
+        if line and font.getlength(candidate) + 2 * stroke_width > max_width:
+            lines.append(line)
+            line = word
+        else:
+            line = candidate
+    if line:
+        lines.append(line)
+    return "\n".join(lines)
+
+
+@lru_cache(maxsize=CAPTION_CACHE_SIZE)
+def render_caption(text, max_width, fontsize=70, color="yellow", stroke_color="black", stroke_width=2):
+    """Returns (rgb, alpha) for a caption centered in a max_width wide box.
+
+    rgb is uint8 (height, max_width, 3) and alpha is float32 (height, max_width)
+    in 0..1, the same layout MoviePy's TextClip(method='caption') produces.
+    """
+    font = load_font(fontsize)
+    wrapped = wrap_text(text, font, max_width, stroke_width)
+    measure = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
+    left, top, right, bottom = measure.multiline_textbbox((0, 0), wrapped, font=font, stroke_width=stroke_width, align="center")
+    height = max(1, bottom - top)
+
+    image = Image.new("RGBA", (max_width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    draw.multiline_text((max_width / 2, -top), wrapped, font=font, fill=color, anchor="ma", align="center",
+                        stroke_width=stroke_width, stroke_fill=stroke_color)
+
+    rgba = np.asarray(image)
+    rgb = np.ascontiguousarray(rgba[:, :, :3])
+    alpha = rgba[:, :, 3].astype(np.float32) / 255
+    rgb.flags.writeable = False
+    alpha.flags.writeable = False
+    return rgb, alpha
+
+
+def cache_stats():
+    """Hit/miss counters of the caption cache."""
+    info = render_caption.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "hit_ratio": round(info.hits / lookups, 4) if lookups else 0.0,
+        "size": info.currsize,
+        "max_size": info.maxsize,
+    }
+
+
+class SubtitleTrack:
+    """Subtitle cues indexed by time, blended straight onto video frames.
+
+    Cues are kept sorted by start time with a running maximum of their end
+    times, so finding the captions visible at t is a binary search plus a short
+    walk back over overlapping cues, however many cues there are.
+    """
+
+    def __init__(self, cues, video_width, video_height, fontsize=70, color="yellow", stroke_color="black", stroke_width=2):
+        cues = sorted((start, end, text) for start, end, text in cues if end > start)
+        self.starts = np.array([start for start, _, _ in cues], dtype=np.float64)
+        self.ends = np.array([end for _, end, _ in cues], dtype=np.float64)
+        self.max_ends = np.maximum.accumulate(self.ends) if len(cues) else self.ends
+        self.texts = [text for _, _, text in cues]
+        self.video_width = video_width
+        self.video_height = video_height
+        self.max_width = int(video_width * 0.8)  # Limit width to 80% of video width
+        self.style = {"fontsize": fontsize, "color": color, "stroke_color": stroke_color, "stroke_width": stroke_width}
+
+    def active(self, t):
+        """Indices of the cues visible at time t (start <= t < end), oldest first."""
+        found = []
+        i = int(np.searchsorted(self.starts, t, side="right")) - 1
+        while i >= 0 and self.max_ends[i] > t:
+            if self.ends[i] > t:
+                found.append(i)
+            i -= 1
+        return found[::-1]
+
+    def prerender(self):
+        """Rasterize every caption up front so rendering frames only blends."""
+        for text in set(self.texts):
+            render_caption(text, self.max_width, **self.style)
+
+    def blend(self, frame, t):
+        """Returns frame with the captions active at t composited in the center."""
+        active = self.active(t)
+        if not active:
+            return frame
+        frame = np.array(frame)  # Decoded frames may be shared or read-only
+        for i in active:
+            rgb, alpha = render_caption(self.texts[i], self.max_width, **self.style)
+            height, width = alpha.shape
+            x = (frame.shape[1] - width) // 2
+            y = (frame.shape[0] - height) // 2
+            # Crop the overlay if it is larger than the frame
+            x0, y0 = max(x, 0), max(y, 0)
+            x1, y1 = min(x + width, frame.shape[1]), min(y + height, frame.shape[0])
+            a = alpha[y0 - y:y1 - y, x0 - x:x1 - x, None]
+            region = frame[y0:y1, x0:x1].astype(np.float32)
+            frame[y0:y1, x0:x1] = (region * (1 - a) + rgb[y0 - y:y1 - y, x0 - x:x1 - x] * a).astype(np.uint8)
+        return frame
@@ -0,0 +1,132 @@
+"""Streaming silence removal on int16 buffers that keeps track of where every sample went."""
+from bisect import bisect_right
+
+import numpy as np
+
+
+class SilenceTrimmer:
+    """Collapses long silences in a stream of int16 chunks.
+
+    Audio is measured in frames of `frame_ms`; a frame is silent when its RMS is
+    below `silence_thresh` dBFS. Silences of at least `min_silence_len` ms are cut
+    down to `keep_silence` ms on each side that touches speech, matching pydub's
+    split_on_silence. Trailing silent frames are held back until the next speech
+    (or flush) decides how much of them to keep.
+
+    Every kept span is recorded, so positions in the input can be mapped to the
+    trimmed output afterwards with map_sample().
+    """
+
+    def __init__(self, sample_rate=24000, min_silence_len=100, silence_thresh=-45, keep_silence=50, frame_ms=10):
+        self.sample_rate = sample_rate
+        self.frame = max(1, sample_rate * frame_ms // 1000)
+        self.min_frames = max(1, min_silence_len // frame_ms)
+        self.keep_frames = keep_silence // frame_ms
+        self.threshold = 32768 * 10 ** (silence_thresh / 20)  # dBFS -> RMS amplitude
+        self.position = 0  # Input samples fed so far
+        self._buffer = np.zeros(0, dtype=np.int16)
+        self._buffer_start = 0  # Input position of _buffer[0]
+        self._out_pos = 0
+        self._seen_speech = False
+        self._span_in = []  # Kept spans as parallel lists: input start, output start, length
+        self._span_out = []
+        self._span_len = []
+
+    def _silent_frames(self, samples, final):
+        n_full = len(samples) // self.frame
+        frames = samples[:n_full * self.frame].reshape(n_full, self.frame).astype(np.float32)
+        rms = np.sqrt(np.mean(frames ** 2, axis=1))
+        if final and len(samples) > n_full * self.frame:
+            rest = samples[n_full * self.frame:].astype(np.float32)
+            rms = np.append(rms, np.sqrt(np.mean(rest ** 2)))
+        return rms < self.threshold
+
+    def _process(self, samples, silent, final):
+        n = len(silent)
+        keep = np.ones(n, dtype=bool)
+        edges = np.diff(np.concatenate(([0], silent.astype(np.int8), [0])))
+        for start, end in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)):
+            if end - start < self.min_frames:
+                continue
+            leading = start == 0 and not self._seen_speech
+            trailing = end == n and final
+            if leading and trailing:
+                keep[start:end] = False
+            elif leading:
+                keep[start:end - self.keep_frames] = False
+            elif trailing:
+                keep[start + self.keep_frames:end] = False
+            elif end - start > 2 * self.keep_frames:
+                keep[start + self.keep_frames:end - self.keep_frames] = False
+        if not silent.all():
+            self._seen_speech = True
+
+        # Turn runs of kept frames into sample spans
+        edges = np.diff(np.concatenate(([0], keep.astype(np.int8), [0])))
+        pieces = []
+        for start, end in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)):
+            a, b = start * self.frame, min(end * self.frame, len(samples))
+            self._add_span(self._buffer_start + a, b - a)
+            pieces.append(samples[a:b])
+        return np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.int16)
+
+    def _add_span(self, in_start, length):
+        if self._span_in and self._span_in[-1] + self._span_len[-1] == in_start:
+            self._span_len[-1] += length
+        else:
+            self._span_in.append(in_start)
+            self._span_out.append(self._out_pos)
+            self._span_len.append(length)
+        self._out_pos += length
+
+    def feed(self, chunk):
+        """Adds a chunk of input and returns the trimmed samples that are now final."""
+        self.position += len(chunk)
+        samples = np.concatenate((self._buffer, chunk))
+        silent = self._silent_frames(samples, final=False)
+        speech = np.flatnonzero(~silent)
+        if not len(speech):
+            self._buffer = samples
+            return np.zeros(0, dtype=np.int16)
+        decided = speech[-1] + 1  # Frames up to the last speech are final
+        out = self._process(samples[:decided * self.frame], silent[:decided], final=False)
+        self._buffer = samples[decided * self.frame:]
+        self._buffer_start += decided * self.frame
+        return out
+
+    def flush(self):
+        """Trims whatever is still held back and returns it; call once at the end."""
+        samples = self._buffer
+        out = self._process(samples, self._silent_frames(samples, final=True), final=True) if len(samples) else samples
+        self._buffer_start += len(samples)
+        self._buffer = np.zeros(0, dtype=np.int16)
+        return out
+
+    def map_sample(self, position):
+        """Maps an input sample position to the trimmed output; cut positions collapse to the cut point."""
+        i = bisect_right(self._span_in, position) - 1
+        if i < 0:
+            return 0
+        offset = position - self._span_in[i]
+        return self._span_out[i] + min(offset, self._span_len[i])
+
+    def remap_words(self, words, segment_start):
+        """Remaps word timestamps of a segment that started at input sample segment_start.
+
+        Returned times are relative to where that segment starts in the trimmed output.
+        """
+        out_start = self.map_sample(segment_start)
+
+        def remap(seconds):
+            if seconds is None:
+                return None
+            position = self.map_sample(segment_start + int(round(seconds * self.sample_rate)))
+            return round((position - out_start) / self.sample_rate, 3)
+
+        return [{"word": word["word"], "start": remap(word["start"]), "end": remap(word["end"])} for word in words]
+
+
+def trim_silence(audio, sample_rate=24000, keep_silence=50):
+    """One-shot silence removal for a complete int16 buffer."""
+    trimmer = SilenceTrimmer(sample_rate=sample_rate, keep_silence=keep_silence)
+    return np.concatenate((trimmer.feed(audio), trimmer.flush()))
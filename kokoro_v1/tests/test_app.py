@@ -0,0 +1,79 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("click")
+pytest.importorskip("prometheus_client")
+
+import app
+
+
+def test_importing_app_does_no_cache_disk_work(tmp_path):
+    env = {**os.environ, "KOKORO_SEGMENT_CACHE_DIR": str(tmp_path / "segments"),
+           "KOKORO_AUDIO_CACHE_DIR": str(tmp_path / "audio"), "KOKORO_G2P_CACHE_PATH": str(tmp_path / "g2p.pkl")}
+    subprocess.run([sys.executable, "-c", "import app"], cwd=os.path.dirname(app.__file__), env=env, check=True)
+    assert os.listdir(tmp_path) == []
+
+
+def test_split_units_splits_before_line_breaks_are_folded():
+    text = "Breaking news\nThe river rose. The bridge is gone!\n\nNobody remembers a flood like it?"
+    assert app.split_units(text) == [
+        "Breaking news", "The river rose.", "The bridge is gone!", "Nobody remembers a flood like it?",
+    ]
+
+
+def test_split_units_handles_sentence_ends_without_spaces():
+    assert app.split_units("川は増した。朝になった。") == ["川は増した。", "朝になった。"]
+
+
+def test_editing_one_sentence_keeps_the_other_units():
+    article = "The river rose. By morning the bridge was gone. The town woke up to a new shoreline."
+    edited = article.replace("By morning", "By early morning")
+    before, after = app.split_units(article), app.split_units(edited)
+    assert len(before) == len(after)
+    assert [i for i, (a, b) in enumerate(zip(before, after)) if a != b] == [1]
+
+
+def test_tts_cache_key_tells_line_breaks_from_spaces():
+    key = app.tts_cache_key("Breaking news\nThe river rose.", "American English", "af_bella", 1, False, False, 0.05)
+    assert key != app.tts_cache_key("Breaking news The river rose.", "American English", "af_bella", 1, False, False, 0.05)
+    assert key == app.tts_cache_key("Breaking news\n\nThe river  rose.", "American English", "af_bella", 1, False, False, 0.05)
+
+
+def test_lookahead_only_evaluates_a_window_ahead():
+    evaluated = []
+
+    def items():
+        for i in range(10):
+            evaluated.append(i)
+            yield i
+
+    stream = app.lookahead(items(), 3)
+    assert next(stream) == 0
+    assert evaluated == [0, 1, 2, 3]
+    assert list(stream) == list(range(1, 10))
+
+
+def fake_segments(count, speech, silence):
+    """Segments of speech samples of noise then silence samples of silence, each with one word at 0.1-0.2 s."""
+    rng = np.random.default_rng(0)
+    for i in range(count):
+        audio = np.concatenate((rng.integers(-8000, 8000, speech), np.zeros(silence))).astype(np.int16)
+        yield {"text": f"Sentence {i}.", "audio": audio, "words": [{"word": f"w{i}", "start": 0.1, "end": 0.2}]}
+
+
+@pytest.mark.parametrize("remove_silence, segment_samples", [(False, 7200 + 12000), (True, 7200 + 2400)])
+def test_word_starts_follow_segment_sample_offsets(monkeypatch, remove_silence, segment_samples):
+    monkeypatch.setattr(app, "synthesize_segments", lambda text, **kwargs: fake_segments(4, 7200, 12000))
+    audio, timestamps = app.synthesize("unused", remove_silence=remove_silence, keep_silence_up_to=0.05)
+
+    words = app.adjust_timestamps(timestamps)
+    # 0.5 s of silence between sentences is cut down to 50 ms on each side when trimming
+    assert [word["start"] for word in words] == [round(i * segment_samples / app.SAMPLE_RATE + 0.1, 3) for i in range(4)]
+    assert [timestamps[i]["start"] for i in range(4)] == [round(i * segment_samples / app.SAMPLE_RATE, 3) for i in range(4)]
+    assert len(audio) >= 3 * segment_samples + 7200
@@ -0,0 +1,94 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+torch = pytest.importorskip("torch")
+kokoro = pytest.importorskip("kokoro")
+
+from batching import batched_forward
+from inference_backends import tokenize
+
+PHONEMES = [
+    "hˈɛlOʊ.",
+    "ðə ɹˈɪvəɹ ɹˈOz kwˈaɪətli θɹu ðə nˈaɪt.",
+    "baɪ mˈɔɹnɪŋ, ðɪ ˈOld bɹˈɪʤ wʌz ɡˈɔn, ænd ðə tˈaʊn wˈOk ˈʌp tə ɐ nˈu ʃˈɔɹlaɪn.",
+]
+
+
+class SeededDecoder(torch.nn.Module):
+    """Reseeds before every call so the vocoder's noise is the same batched and alone."""
+
+    def __init__(self, decoder):
+        super().__init__()
+        self.decoder = decoder
+
+    def forward(self, *args):
+        torch.manual_seed(0)
+        return self.decoder(*args)
+
+
+def stub_config(vocab):
+    """Kokoro-82M's architecture with a small PL-BERT; the decoder's sizes are fixed by the model code."""
+    return {
+        "istftnet": {"upsample_kernel_sizes": [20, 12], "upsample_rates": [10, 6], "gen_istft_hop_size": 5,
+                     "gen_istft_n_fft": 20, "resblock_dilation_sizes": [[1, 3, 5], [1, 3, 5], [1, 3, 5]],
+                     "resblock_kernel_sizes": [3, 7, 11], "upsample_initial_channel": 512},
+        "dim_in": 64, "dropout": 0.2, "hidden_dim": 512, "max_conv_dim": 512, "max_dur": 50, "multispeaker": True,
+        "n_layer": 3, "n_mels": 80, "n_token": 178, "style_dim": 128, "text_encoder_kernel_size": 5,
+        "plbert": {"hidden_size": 64, "num_attention_heads": 2, "intermediate_size": 128,
+                   "max_position_embeddings": 512, "num_hidden_layers": 2, "dropout": 0.1},
+        "vocab": vocab,
+    }
+
+
+@pytest.fixture(scope="module")
+def stub_model(tmp_path_factory):
+    """A KModel with random weights, so no download is needed."""
+    vocab = {c: i + 1 for i, c in enumerate(sorted(set("".join(PHONEMES))))}
+    no_weights = tmp_path_factory.mktemp("stub") / "empty.pth"
+    torch.save({}, no_weights)
+    torch.manual_seed(0)
+    model = kokoro.KModel(repo_id="hexgrad/Kokoro-82M", config=stub_config(vocab), model=str(no_weights)).eval()
+    with torch.no_grad():
+        # A few frames per token, as with the real weights, instead of up to max_dur
+        model.predictor.duration_proj.linear_layer.weight.mul_(0.01)
+        model.predictor.duration_proj.linear_layer.bias.fill_(-2.5)
+    model.decoder = SeededDecoder(model.decoder)
+    return model
+
+
+@pytest.fixture(scope="module")
+def model():
+    try:
+        model = kokoro.KModel(repo_id="hexgrad/Kokoro-82M").eval()
+    except Exception as e:
+        pytest.skip(f"Model weights unavailable: {e}")
+    model.decoder = SeededDecoder(model.decoder)
+    return model
+
+
+def assert_batched_matches_unbatched(model):
+    torch.manual_seed(1)
+    ref_s = torch.randn(len(PHONEMES), 256)
+    token_lists = [tokenize(model.vocab, model.context_length, phonemes) for phonemes in PHONEMES]
+    assert len({len(tokens) for tokens in token_lists}) == len(PHONEMES)
+
+    batched = batched_forward(model, token_lists, ref_s)
+
+    for i, tokens in enumerate(token_lists):
+        audio, pred_dur = model.forward_with_tokens(torch.LongTensor([tokens]), ref_s[i:i + 1])
+        batched_audio, batched_dur = batched[i]
+        assert torch.equal(batched_dur, pred_dur.squeeze())
+        assert batched_audio.shape == audio.squeeze().shape
+        assert torch.allclose(batched_audio, audio.squeeze(), atol=1e-4)
+
+
+def test_batched_matches_unbatched_for_different_lengths(model):
+    assert_batched_matches_unbatched(model)
+
+
+def test_batched_matches_unbatched_on_a_stub_model(stub_model):
+    assert_batched_matches_unbatched(stub_model)
@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("prometheus_client")
+
+from metrics import StatsCollector
+
+
+def samples(collector, metric):
+    return {sample.labels["cache"]: sample.value
+            for family in collector.collect() if family.name == metric for sample in family.samples}
+
+
+def test_bytes_saved_is_exported_for_caches_that_count_it():
+    collector = StatsCollector({
+        "audio_cache": lambda: {"hits": 3, "misses": 1, "hit_ratio": 0.75, "bytes_saved": 4096},
+        "pipelines": lambda: {"hits": 2, "misses": 0, "hit_ratio": 1.0},
+    })
+    assert samples(collector, "kokoro_cache_bytes_saved") == {"audio_cache": 4096}
+    assert samples(collector, "kokoro_cache_hits") == {"audio_cache": 3, "pipelines": 2}
@@ -0,0 +1,70 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("kokoro")
+pytest.importorskip("click")
+pytest.importorskip("prometheus_client")
+
+import app
+from pipeline_pool import PipelinePool
+from scripts.benchmark import StubModel
+from tts_cache import DiskCache
+
+ARTICLE = "El río creció durante la noche. Por la mañana el puente ya no estaba. El pueblo despertó con una nueva orilla."
+
+
+class RecordingModel(StubModel):
+    """StubModel that remembers the phonemes of every chunk it synthesizes."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def __call__(self, phonemes, ref_s, speed=1, return_output=False):
+        self.calls.append(phonemes)
+        return super().__call__(phonemes, ref_s, speed, return_output)
+
+
+@pytest.fixture
+def model(monkeypatch, tmp_path):
+    model = RecordingModel()
+    monkeypatch.setattr(app, "pipeline_pool", PipelinePool(max_size=1, model_factory=lambda: model))
+    monkeypatch.setattr(app, "get_backend_model", lambda backend=None: model)
+    monkeypatch.setattr(app, "get_parallel_synthesizer", lambda: None)
+    monkeypatch.setattr(app, "segment_cache", DiskCache(str(tmp_path), 10 * 1024 * 1024))
+    try:
+        app.update_pipeline("Spanish").voices["ef_dora"] = torch.zeros(510, 1, 256)
+    except Exception as e:
+        pytest.skip(f"Spanish G2P unavailable: {e}")
+    return model
+
+
+def synthesize(text, Language="Spanish"):
+    return [segment["text"] for segment in app.synthesize_segments(text, Language=Language, voice="ef_dora")]
+
+
+def test_only_the_edited_sentence_reaches_the_model(model):
+    synthesize(ARTICLE)
+    assert len(model.calls) == 3
+
+    model.calls.clear()
+    edited = ARTICLE.replace("Por la mañana", "Por la mañana temprano")
+    texts = synthesize(edited)
+
+    assert len(texts) == 3
+    assert len(model.calls) == 1
+    assert model.calls[0] == list(app.phonemize(app.update_pipeline("Spanish"), texts[1]))[0].phonemes
+
+
+def test_segments_without_words_are_not_reused_for_word_timed_requests(model, monkeypatch):
+    # Both names reach the same pipeline, only English asks for word timings
+    monkeypatch.setitem(app.language_map, "American English", "e")
+    synthesize(ARTICLE, Language="Spanish")
+    model.calls.clear()
+    synthesize(ARTICLE, Language="American English")
+    assert len(model.calls) == 3
@@ -0,0 +1,69 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from silence import SilenceTrimmer, trim_silence
+
+RATE = 24000
+
+
+def speech(seconds, seed=0):
+    return np.random.default_rng(seed).integers(-8000, 8000, int(seconds * RATE)).astype(np.int16)
+
+
+def silence(seconds):
+    return np.zeros(int(seconds * RATE), dtype=np.int16)
+
+
+def stream(trimmer, chunks):
+    return np.concatenate([trimmer.feed(chunk) for chunk in chunks] + [trimmer.flush()])
+
+
+@pytest.mark.parametrize("chunk_size", [1000, 2400, 7777])
+def test_streaming_matches_one_shot(chunk_size):
+    audio = np.concatenate((silence(0.4), speech(0.3), silence(0.08), speech(0.2, 1), silence(0.6),
+                            speech(0.25, 2), silence(0.5)))
+    chunks = [audio[i:i + chunk_size] for i in range(0, len(audio), chunk_size)]
+    streamed = stream(SilenceTrimmer(sample_rate=RATE, keep_silence=50), chunks)
+    np.testing.assert_array_equal(streamed, trim_silence(audio, sample_rate=RATE, keep_silence=50))
+
+
+def test_leading_and_trailing_silence_is_cut_to_keep_silence():
+    audio = np.concatenate((silence(0.5), speech(0.3), silence(0.5)))
+    trimmed = trim_silence(audio, sample_rate=RATE, keep_silence=50)
+    assert len(trimmed) == int((0.05 + 0.3 + 0.05) * RATE)
+    np.testing.assert_array_equal(trimmed[int(0.05 * RATE):int(0.35 * RATE)], audio[int(0.5 * RATE):int(0.8 * RATE)])
+
+
+def test_short_pauses_are_kept():
+    audio = np.concatenate((speech(0.3), silence(0.08), speech(0.3, 1)))
+    np.testing.assert_array_equal(trim_silence(audio, sample_rate=RATE, keep_silence=50), audio)
+
+
+def test_words_after_a_removed_gap_move_back_by_the_cut():
+    trimmer = SilenceTrimmer(sample_rate=RATE, keep_silence=50)
+    stream(trimmer, [np.concatenate((speech(0.3), silence(0.5), speech(0.3, 1)))])
+    words = [{"word": "before", "start": 0.1, "end": 0.2}, {"word": "after", "start": 0.9, "end": 1.0}]
+    # 0.5 s of silence is cut down to 50 ms on each side, so 0.4 s go
+    assert trimmer.remap_words(words, 0) == [
+        {"word": "before", "start": 0.1, "end": 0.2}, {"word": "after", "start": 0.5, "end": 0.6},
+    ]
+
+
+def test_words_are_remapped_per_segment_across_chunks():
+    first = np.concatenate((speech(0.3), silence(0.25)))
+    second = np.concatenate((silence(0.25), speech(0.3, 1)))
+    trimmer = SilenceTrimmer(sample_rate=RATE, keep_silence=50)
+    stream(trimmer, [first, second])
+    words = trimmer.remap_words([{"word": "river", "start": 0.3, "end": 0.4}, {"word": None, "start": None, "end": None}],
+                                len(first))
+    # The second segment starts inside the removed gap, which collapses to the cut after 50 ms of kept silence;
+    # its speech follows another 50 ms later
+    segment_start = trimmer.map_sample(len(first)) / RATE
+    assert segment_start == pytest.approx(0.35)
+    assert words == [{"word": "river", "start": 0.1, "end": 0.2}, {"word": None, "start": None, "end": None}]
+    assert segment_start + words[0]["start"] == pytest.approx(0.45)  # 0.85 s in the input, 0.4 s before it cut
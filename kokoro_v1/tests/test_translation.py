@@ -0,0 +1,35 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from translation import TranslationCache, Translator, split_sentences
+
+
+class UpperBackend:
+    """Translates by upper-casing, line by line, and remembers what it was asked."""
+
+    name = "upper"
+
+    def __init__(self):
+        self.requests = []
+
+    def translate(self, text, target):
+        self.requests.append(text)
+        return text.upper()
+
+
+def test_split_sentences_keeps_each_sentence_on_one_line():
+    assert split_sentences("Breaking\nnews  from the river.\nThe bridge is gone!") == [
+        "Breaking news from the river.", "The bridge is gone!",
+    ]
+
+
+def test_sentences_with_line_breaks_stay_aligned_and_are_cached(tmp_path):
+    backend = UpperBackend()
+    translator = Translator(backend, TranslationCache(str(tmp_path / "cache.sqlite3")))
+    text = "Breaking\nnews from the river. The bridge\nis gone!"
+
+    assert translator.translate(text, "de") == "BREAKING NEWS FROM THE RIVER. THE BRIDGE IS GONE!"
+    assert translator.translate(text, "de") == "BREAKING NEWS FROM THE RIVER. THE BRIDGE IS GONE!"
+    assert len(backend.requests) == 1
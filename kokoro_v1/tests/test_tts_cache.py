@@ -0,0 +1,57 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tts_cache import DiskCache
+
+
+def write(size):
+    def write_files(entry_dir):
+        with open(os.path.join(entry_dir, "audio.bin"), "wb") as f:
+            f.write(b"\0" * size)
+    return write_files
+
+
+def age(cache, key, seconds):
+    # Pretends the entry was last used `seconds` ago
+    path = os.path.join(cache.root, key)
+    os.utime(path, (time.time() - seconds, time.time() - seconds))
+
+
+def disk_usage(root):
+    return sum(os.path.getsize(os.path.join(root, key, name))
+               for key in os.listdir(root) if not key.startswith(".") for name in os.listdir(os.path.join(root, key)))
+
+
+def test_entries_from_another_process_are_found(tmp_path):
+    first, second = DiskCache(str(tmp_path), 10_000), DiskCache(str(tmp_path), 10_000)
+    first.put("a", write(100))
+    assert second.get("a") == {"audio": os.path.join(str(tmp_path), "a", "audio.bin")}
+    assert second.stats()["bytes_saved"] == 100
+
+
+def test_the_cap_holds_across_processes(tmp_path):
+    first, second = DiskCache(str(tmp_path), 250, grace_seconds=10), DiskCache(str(tmp_path), 250, grace_seconds=10)
+    for i, cache in enumerate([first, second, first, second]):
+        cache.put(f"k{i}", write(100))
+        age(cache, f"k{i}", 100 - i)
+    assert disk_usage(str(tmp_path)) <= 250
+    assert sorted(os.listdir(str(tmp_path))) == [".lock", "k2", "k3"]
+
+
+def test_recently_read_entries_are_not_evicted(tmp_path):
+    writer, reader = DiskCache(str(tmp_path), 150, grace_seconds=60), DiskCache(str(tmp_path), 150, grace_seconds=60)
+    writer.put("old", write(100))
+    age(writer, "old", 600)
+    files = reader.get("old")  # Another process is still copying these
+    writer.put("new", write(100))
+    assert os.path.exists(files["audio"])
+
+
+def test_another_writers_temporary_directory_survives_a_start(tmp_path):
+    in_progress = tmp_path / ".tmp-writer"
+    in_progress.mkdir()
+    DiskCache(str(tmp_path), 1000)
+    assert in_progress.exists()
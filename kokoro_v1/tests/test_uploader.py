@@ -0,0 +1,83 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+boto3 = pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+pytest.importorskip("prometheus_client")
+
+from boto3.s3.transfer import TransferConfig
+
+from uploader import MB, VideoUploader
+
+BUCKET = "kokoro-test"
+TABLE = "wso_metadata"
+
+
+@pytest.fixture
+def uploader(monkeypatch):
+    for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "AWS_SESSION_TOKEN"):
+        monkeypatch.setenv(name, "testing")
+    with moto.mock_aws():
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket=BUCKET)
+        dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
+        dynamodb.create_table(TableName=TABLE, KeySchema=[{"AttributeName": "request_id", "KeyType": "HASH"}],
+                              AttributeDefinitions=[{"AttributeName": "request_id", "AttributeType": "S"}],
+                              BillingMode="PAY_PER_REQUEST")
+        # 5 MB parts, the smallest S3 accepts, so the 6 MB video goes up as a multipart upload
+        config = TransferConfig(multipart_threshold=5 * MB, multipart_chunksize=5 * MB)
+        uploader = VideoUploader(BUCKET, TABLE, s3_client=s3, dynamodb=dynamodb, max_workers=4, transfer_config=config)
+        yield uploader
+        uploader.executor.shutdown()
+
+
+def test_session_uploads_everything_before_writing_the_item(uploader, tmp_path):
+    events = []
+    upload_file, put_item = uploader.upload_file, uploader.table.put_item
+
+    def recording_upload(path, key):
+        result = upload_file(path, key)
+        events.append(("upload", key))
+        return result
+
+    def recording_put_item(**kwargs):
+        events.append(("put_item", kwargs["Item"]["request_id"]))
+        return put_item(**kwargs)
+
+    uploader.upload_file = recording_upload
+    uploader.table.put_item = recording_put_item
+
+    video = tmp_path / "final_video.mp4"
+    video.write_bytes(os.urandom(6 * MB))
+    session = uploader.session("job-1")
+    session.add("final_video", str(video))
+    for number in (10, 2, 1):  # Finished out of order
+        part = tmp_path / f"final_video_part{number}.mp4"
+        part.write_bytes(f"part {number}".encode())
+        session.add("part", str(part))
+
+    full_video_url, metadata = session.finish("Title", "Content", 12.5)
+
+    assert events[-1] == ("put_item", "job-1")
+    assert [event for event, _ in events].count("put_item") == 1
+    assert len([event for event, _ in events if event == "upload"]) == 4
+
+    keys = [part["key"] for part in metadata["parts"]]
+    assert keys == [f"videos/job-1/parts/final_video_part{number}.mp4" for number in (1, 2, 10)]
+    assert all(part["url"] and part["key"] in part["url"] for part in metadata["parts"])
+    assert full_video_url and "videos/job-1/full_video.mp4" in full_video_url
+
+    s3 = uploader.s3_client
+    assert s3.head_object(Bucket=BUCKET, Key="videos/job-1/full_video.mp4")["ContentLength"] == 6 * MB
+    assert "-" in s3.head_object(Bucket=BUCKET, Key="videos/job-1/full_video.mp4")["ETag"]  # Multipart ETag
+    for number in (1, 2, 10):
+        body = s3.get_object(Bucket=BUCKET, Key=f"videos/job-1/parts/final_video_part{number}.mp4")["Body"].read()
+        assert body == f"part {number}".encode()
+
+    item = uploader.table.get_item(Key={"request_id": "job-1"})["Item"]
+    assert item["full_video_key"] == "videos/job-1/full_video.mp4"
+    assert [part["key"] for part in item["parts"]] == keys
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from voice_mix import normalize_voice, parse_mix
+
+
+def test_spellings_of_the_same_mix_normalize_alike():
+    assert normalize_voice("af_heart:3, af_bella:7") == normalize_voice("af_bella:0.7,af_heart:0.3")
+    assert normalize_voice("af_bella:1,af_heart:0") == "af_bella"
+
+
+@pytest.mark.parametrize("voice", ["af_bella:nan,af_heart:1", "af_bella:inf,af_heart:1", "af_bella:-inf"])
+def test_non_finite_weights_are_rejected(voice):
+    with pytest.raises(ValueError, match="Non-finite weight"):
+        parse_mix(voice)
+
+
+@pytest.mark.parametrize("voice", ["af_bella:-1,af_heart:1", "af_bella:x", ",af_heart", "af_bella:0"])
+def test_invalid_mixes_are_rejected(voice):
+    with pytest.raises(ValueError):
+        parse_mix(voice)
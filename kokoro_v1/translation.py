@@ -0,0 +1,202 @@
+"""Concurrent, cached text translation with a pluggable backend.
+
+Text is split into sentences and every sentence is looked up in a persistent
+SQLite cache first. The remaining sentences are packed into chunks of up to
+chunk_size characters, one sentence per line, and the chunks are translated
+concurrently on a bounded thread pool with retries. Translated lines go back
+into the cache, so revised articles only pay for the sentences that changed.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+TRANSLATION_CACHE_PATH = os.environ.get("KOKORO_TRANSLATION_CACHE",
+                                        os.path.join(os.path.dirname(os.path.abspath(__file__)), "translation_cache.sqlite3"))
+TRANSLATION_WORKERS = int(os.environ.get("KOKORO_TRANSLATION_WORKERS", 4))
+# "google" (default) or "http" for a LibreTranslate-compatible service at KOKORO_TRANSLATOR_URL
+TRANSLATOR_BACKEND = os.environ.get("KOKORO_TRANSLATOR", "google")
+TRANSLATOR_URL = os.environ.get("KOKORO_TRANSLATOR_URL", "http://localhost:5000")
+
+
+def split_sentences(text):
+    """Sentences of text, each on one line so a chunk keeps one sentence per line."""
+    sentences = (" ".join(sentence.split()) for sentence in re.split(r'(?<=[.!?])\s+', text.strip()))
+    return [sentence for sentence in sentences if sentence]
+
+
+def sentence_hash(sentence):
+    return hashlib.sha256(sentence.encode("utf-8")).hexdigest()
+
+
+class GoogleBackend:
+    """Google Translate through deep_translator, with one client per thread and target language."""
+
+    name = "google"
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def translate(self, text, target):
+        clients = self._local.__dict__.setdefault("clients", {})
+        if target not in clients:
+            from deep_translator import GoogleTranslator
+            clients[target] = GoogleTranslator(source="auto", target=target)
+        return clients[target].translate(text)
+
+
+class HTTPBackend:
+    """Any service speaking the LibreTranslate /translate API, e.g. a local stand-in for tests and benchmarks."""
+
+    name = "http"
+
+    def __init__(self, url=TRANSLATOR_URL, timeout=30):
+        self.url = url.rstrip("/") + "/translate"
+        self.timeout = timeout
+
+    def translate(self, text, target):
+        payload = json.dumps({"q": text, "source": "auto", "target": target, "format": "text"}).encode("utf-8")
+        request = urllib.request.Request(self.url, data=payload, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.load(response)["translatedText"]
+
+
+BACKENDS = {"google": GoogleBackend, "http": HTTPBackend}
+
+
+class TranslationCache:
+    """Sentence translations in SQLite, keyed by backend, target language and sha256 of the source sentence."""
+
+    def __init__(self, path):
+        self.path = path
+        self.enabled = True  # When False every lookup misses, but translations are still stored
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            "backend TEXT, target TEXT, source_hash TEXT, translation TEXT, "
+            "PRIMARY KEY (backend, target, source_hash))"
+        )
+        self._conn.commit()
+        self._hits = 0
+        self._misses = 0
+
+    def get_many(self, backend, target, hashes):
+        """Returns {source_hash: translation} for the hashes that are cached."""
+        found = {}
+        with self._lock:
+            if self.enabled:
+                for i in range(0, len(hashes), 500):  # Stay below SQLite's variable limit
+                    batch = hashes[i:i + 500]
+                    rows = self._conn.execute(
+                        f"SELECT source_hash, translation FROM translations WHERE backend = ? AND target = ? "
+                        f"AND source_hash IN ({','.join('?' * len(batch))})",
+                        [backend, target, *batch]
+                    ).fetchall()
+                    found.update(rows)
+            self._hits += len(found)
+            self._misses += len(hashes) - len(found)
+        return found
+
+    def put_many(self, backend, target, translations):
+        """Stores {source_hash: translation}."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?)",
+                [(backend, target, source_hash, translation) for source_hash, translation in translations.items()]
+            )
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            entries = self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+            return {
+                "entries": entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class Translator:
+    """Translates long texts chunk-parallel through a backend, with a sentence cache in front."""
+
+    def __init__(self, backend, cache, max_workers=TRANSLATION_WORKERS, retries=3, backoff=0.5):
+        self.backend = backend
+        self.cache = cache
+        self.retries = retries
+        self.backoff = backoff
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="translate")
+
+    def _translate_chunk(self, chunk, target):
+        for attempt in range(self.retries + 1):
+            try:
+                return self.backend.translate(chunk, target)
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                delay = self.backoff * 2 ** attempt
+                print(f"Translation failed ({e}), retrying in {delay:.1f}s...")
+                time.sleep(delay)
+
+    def translate(self, text, target, chunk_size=500):
+        """Translates text into the target language code."""
+        sentences = split_sentences(text)
+        hashes = [sentence_hash(sentence) for sentence in sentences]
+        cached = self.cache.get_many(self.backend.name, target, sorted(set(hashes)))
+        translated = [cached.get(h) for h in hashes]
+
+        # Pack the missing sentences into chunks, one sentence per line
+        chunks = []  # Lists of sentence indices
+        size = 0
+        for i, sentence in enumerate(sentences):
+            if translated[i] is not None:
+                continue
+            if not chunks or size + len(sentence) + 1 > chunk_size:
+                chunks.append([])
+                size = 0
+            chunks[-1].append(i)
+            size += len(sentence) + 1
+
+        futures = [self._executor.submit(self._translate_chunk, "\n".join(sentences[i] for i in chunk), target)
+                   for chunk in chunks]
+        new = {}
+        for chunk, future in zip(chunks, futures):
+            lines = [line.strip() for line in (future.result() or "").split("\n") if line.strip()]
+            if len(lines) == len(chunk):
+                for i, line in zip(chunk, lines):
+                    translated[i] = line
+                    new[hashes[i]] = line
+            else:
+                # The service merged or split lines, so the chunk can only be used as a whole
+                translated[chunk[0]] = " ".join(lines)
+                for i in chunk[1:]:
+                    translated[i] = ""
+        if new:
+            self.cache.put_many(self.backend.name, target, new)
+        return " ".join(t for t in translated if t).strip()
+
+    def stats(self):
+        return {"backend": self.backend.name, **self.cache.stats()}
+
+
+_translator = None
+_translator_lock = threading.Lock()
+
+
+def get_translator():
+    """The process-wide Translator, created on first use from the KOKORO_TRANSLATOR settings."""
+    global _translator
+    with _translator_lock:
+        if _translator is None:
+            if TRANSLATOR_BACKEND not in BACKENDS:
+                raise ValueError(f"Unknown translator backend {TRANSLATOR_BACKEND!r}, expected one of {sorted(BACKENDS)}")
+            _translator = Translator(BACKENDS[TRANSLATOR_BACKEND](), TranslationCache(TRANSLATION_CACHE_PATH))
+        return _translator
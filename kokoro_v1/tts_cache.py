@@ -0,0 +1,204 @@
+"""Content-addressed on-disk cache for synthesized audio and its side files."""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: puts and evictions are only coordinated within one process
+    fcntl = None
+
+EVICTION_GRACE_SECONDS = 60  # An entry read this recently may still be copied by its reader
+STALE_TMP_SECONDS = 3600  # Temporary directories older than this are left over from interrupted puts
+
+
+def cache_key(*parts):
+    """Stable sha256 hex digest of any JSON-serializable parts."""
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """Directory with one sub-directory of files per key.
+
+    The total size is capped at `max_bytes`; the least recently used entries are
+    evicted first. Recency survives restarts because it is kept in the entry
+    directory's mtime.
+
+    Several processes (uvicorn --workers, the Gradio app) can share one root:
+    puts and evictions hold an exclusive lock on root/.lock and re-read the
+    directory first, so the cap holds for all of them together. Entries used
+    within the last `grace_seconds` are never evicted, so another process can
+    finish copying the files get() gave it.
+    """
+
+    def __init__(self, root, max_bytes, grace_seconds=EVICTION_GRACE_SECONDS):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.grace_seconds = grace_seconds
+        self.enabled = True  # When False every lookup misses, but entries are still written
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._lock_path = os.path.join(root, ".lock")
+        self._entries = {}  # key -> [size in bytes, last used]
+        self._hits = 0
+        self._misses = 0
+        self._bytes_saved = 0
+        self._evictions = 0
+        with self._locked():
+            self._remove_stale()
+            self._sync()
+
+    @contextmanager
+    def _locked(self):
+        """Holds this process's lock and, where fcntl exists, the one shared with other processes."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self._lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _remove_stale(self):
+        # Leftovers from interrupted puts; recent ones may still be written by another process
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                if name.startswith(".tmp-") and time.time() - os.path.getmtime(path) > STALE_TMP_SECONDS:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                pass  # Finished or given up meanwhile
+
+    def _sync(self):
+        # Re-reads the entries other processes added, used and evicted; caller holds _locked()
+        entries = {}
+        for key in os.listdir(self.root):
+            if key.startswith("."):
+                continue
+            entry_dir = os.path.join(self.root, key)
+            try:
+                last_used = os.path.getmtime(entry_dir)
+                # Entries never change once in place, so a known size is still right
+                size = self._entries[key][0] if key in self._entries else self._dir_size(entry_dir)
+            except OSError:
+                continue  # Evicted meanwhile
+            entries[key] = [size, last_used]
+        self._entries = entries
+
+    @staticmethod
+    def _dir_size(path):
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+    @staticmethod
+    def _files(entry_dir):
+        return {os.path.splitext(name)[0]: os.path.join(entry_dir, name) for name in os.listdir(entry_dir)}
+
+    def get(self, key):
+        """Returns {name without extension: path} for a cached entry, or None on a miss.
+
+        Entries another process stored are found too.
+        """
+        entry_dir = os.path.join(self.root, key)
+        if not self.enabled:
+            with self._lock:
+                self._misses += 1
+            return None
+        now = time.time()
+        try:
+            os.utime(entry_dir, (now, now))  # Recency every process sees, and the eviction grace period
+            files = self._files(entry_dir)
+            with self._lock:
+                entry = self._entries.get(key)
+            size = entry[0] if entry else self._dir_size(entry_dir)
+        except OSError:
+            # Not cached, or evicted behind our back
+            with self._lock:
+                self._entries.pop(key, None)
+                self._misses += 1
+            return None
+        with self._lock:
+            self._entries[key] = [size, now]
+            self._hits += 1
+            self._bytes_saved += size
+        return files
+
+    def put(self, key, write_files):
+        """Creates the entry for key by calling write_files(entry_dir) and returns its files.
+
+        The files are written to a temporary directory first and renamed into
+        place, so readers never see a half-written entry.
+        """
+        tmp_dir = os.path.join(self.root, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(tmp_dir)
+        try:
+            write_files(tmp_dir)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        size = self._dir_size(tmp_dir)
+        entry_dir = os.path.join(self.root, key)
+        with self._locked():
+            self._sync()
+            if os.path.isdir(entry_dir):
+                # Someone, maybe another process, stored the same content meanwhile
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+            else:
+                os.rename(tmp_dir, entry_dir)
+                self._entries[key] = [size, time.time()]
+            self._evict(keep=key)
+        return self._files(entry_dir)
+
+    def _evict(self, keep):
+        # Caller holds _locked() and has just synced
+        total = sum(size for size, _ in self._entries.values())
+        recent = time.time() - self.grace_seconds
+        for key, (size, last_used) in sorted(self._entries.items(), key=lambda item: item[1][1]):
+            if total <= self.max_bytes or last_used > recent:
+                break  # Sorted by last use, so every later entry is in its grace period too
+            if key == keep:
+                continue
+            shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+            del self._entries[key]
+            total -= size
+            self._evictions += 1
+
+    def stats(self):
+        """Hit ratio, bytes saved and current size of the cache."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(size for size, _ in self._entries.values()),
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+                "bytes_saved": self._bytes_saved,
+                "evictions": self._evictions,
+            }
+
+
+def save_segment(entry_dir, segment):
+    """Stores one synthesized segment (text, int16 audio, words) in a cache entry."""
+    np.save(os.path.join(entry_dir, "audio.npy"), segment["audio"])
+    with open(os.path.join(entry_dir, "segment.json"), "w", encoding="utf-8") as f:
+        json.dump({"text": segment["text"], "words": segment["words"]}, f, ensure_ascii=False)
+
+
+def load_segment(files):
+    """Loads a segment stored by save_segment from the files of its cache entry."""
+    with open(files["segment"], encoding="utf-8") as f:
+        segment = json.load(f)
+    segment["audio"] = np.load(files["audio"])
+    return segment
@@ -0,0 +1,135 @@
+"""Uploads job outputs to S3 while the rest of the job is still running.
+
+Files are handed to an UploadSession as soon as they exist (the full video
+right after rendering, every part as ffmpeg finishes it) and uploaded on a
+thread pool shared by all jobs, each one as a multipart transfer. finish()
+waits for the uploads, presigns the URLs concurrently and only then writes the
+job's DynamoDB item.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+
+from metrics import timed
+
+MB = 1024 * 1024
+UPLOAD_WORKERS = int(os.environ.get("KOKORO_UPLOAD_WORKERS", 8))
+# Part size of multipart uploads; files smaller than one part go up in a single request
+UPLOAD_CHUNK_BYTES = int(float(os.environ.get("KOKORO_UPLOAD_CHUNK_MB", 16)) * MB)
+UPLOAD_FILE_CONCURRENCY = int(os.environ.get("KOKORO_UPLOAD_FILE_CONCURRENCY", 4))
+# Point at a local S3/DynamoDB stand-in such as moto server, e.g. http://localhost:5000
+AWS_ENDPOINT_URL = os.environ.get("KOKORO_AWS_ENDPOINT_URL") or None
+AWS_REGION = os.environ.get("KOKORO_AWS_REGION", "us-east-1")
+
+
+class UploadSession:
+    """Uploads of one job; create it with VideoUploader.session()."""
+
+    def __init__(self, uploader, request_id):
+        self.uploader = uploader
+        self.request_id = request_id
+        self.full_video_key = None
+        self._lock = threading.Lock()
+        self._uploads = []  # (kind, key, future), in submission order
+
+    def add(self, kind, path):
+        """Starts uploading path in the background; kind is "final_video" or "part"."""
+        if kind == "final_video":
+            key = f"videos/{self.request_id}/full_video.mp4"
+            self.full_video_key = key
+        else:
+            key = f"videos/{self.request_id}/parts/{os.path.basename(path)}"
+        future = self.uploader.executor.submit(self.uploader.upload_file, path, key)
+        with self._lock:
+            self._uploads.append((kind, key, future))
+        return future
+
+    def wait(self):
+        """Blocks until no upload is running any more, whether it succeeded or not."""
+        with self._lock:
+            futures = [future for _, _, future in self._uploads]
+        wait(futures)
+
+    def finish(self, title, content, duration):
+        """Waits for every upload, then records the job in DynamoDB and returns the item with presigned URLs."""
+        with self._lock:
+            uploads = list(self._uploads)
+        for _, _, future in uploads:
+            future.result()  # Re-raises the first failed upload
+
+        url_futures = [(kind, key, self.uploader.executor.submit(self.uploader.presigned_url, key))
+                       for kind, key, _ in uploads]
+        full_video_url = None
+        parts = []
+        for kind, key, future in url_futures:
+            if kind == "final_video":
+                full_video_url = future.result()
+            else:
+                parts.append({'key': key, 'url': future.result()})
+        parts.sort(key=lambda part: part_number(part['key']))
+
+        metadata = {
+            'request_id': self.request_id,
+            'title': title,
+            'content': content,
+            'duration': str(duration),  # Convert float to string for DynamoDB
+            'created_at': datetime.utcnow().isoformat(),
+            'full_video_key': self.full_video_key,
+            'parts': parts
+        }
+        with timed("dynamodb_write"):
+            self.uploader.table.put_item(Item=metadata)
+        return full_video_url, metadata
+
+
+def part_number(key):
+    """Part index encoded in a part file name such as ..._part3.mp4."""
+    stem = os.path.splitext(key)[0]
+    digits = stem.rsplit("_part", 1)[-1]
+    return int(digits) if digits.isdigit() else 0
+
+
+class VideoUploader:
+    """S3/DynamoDB destination plus the thread pool that every job's uploads share.
+
+    Clients can be passed in (for example ones created under moto); by default
+    they are created for AWS_REGION and AWS_ENDPOINT_URL.
+    """
+
+    def __init__(self, bucket, table_name, s3_client=None, dynamodb=None, max_workers=UPLOAD_WORKERS,
+                 transfer_config=None, url_expiration=3600):
+        self.bucket = bucket
+        self.s3_client = s3_client or boto3.client('s3', region_name=AWS_REGION, endpoint_url=AWS_ENDPOINT_URL)
+        dynamodb = dynamodb or boto3.resource('dynamodb', region_name=AWS_REGION, endpoint_url=AWS_ENDPOINT_URL)
+        self.table = dynamodb.Table(table_name)
+        self.transfer_config = transfer_config or TransferConfig(
+            multipart_threshold=UPLOAD_CHUNK_BYTES,
+            multipart_chunksize=UPLOAD_CHUNK_BYTES,
+            max_concurrency=UPLOAD_FILE_CONCURRENCY,
+        )
+        self.url_expiration = url_expiration
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upload")
+
+    def upload_file(self, path, key):
+        with timed("s3_upload"):
+            self.s3_client.upload_file(path, self.bucket, key, Config=self.transfer_config)
+        return key
+
+    def presigned_url(self, key):
+        """Presigned GET URL for key, or None if it can't be generated."""
+        try:
+            return self.s3_client.generate_presigned_url(
+                'get_object',
+                Params={'Bucket': self.bucket, 'Key': key},
+                ExpiresIn=self.url_expiration
+            )
+        except Exception as e:
+            print(f"Error generating presigned URL: {e}")
+            return None
+
+    def session(self, request_id):
+        return UploadSession(self, request_id)
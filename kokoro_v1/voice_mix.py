@@ -0,0 +1,89 @@
+"""Weighted voice mixes such as "af_bella:0.7,af_heart:0.3".
+
+A mix spec is normalized first: weights are scaled to sum to 1, and names are
+sorted and merged, so every spelling of the same mix gets the same name. The
+blended voice pack (the weighted sum of the stock packs) is computed once and
+saved to VOICE_MIX_DIR. Later uses, in any process, map the saved file the way
+mmap_store maps stock voices, so a mix then costs what a stock voice costs.
+
+Comma separated voices without weights are averaged, as KPipeline does.
+"""
+import hashlib
+import math
+import os
+import threading
+
+import numpy as np
+
+from mmap_store import MMAP_ENABLED, map_voice
+
+VOICE_MIX_DIR = os.environ.get("KOKORO_VOICE_MIX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "voice_mixes"))
+
+_lock = threading.Lock()
+_blends = {}  # Normalized spec -> tensor, for this process
+
+
+def is_mix(voice):
+    return isinstance(voice, str) and ("," in voice or ":" in voice) and not voice.endswith(".pt")
+
+
+def parse_mix(voice):
+    """[(name, weight), ...] for a mix spec, sorted by name with the weights summing to 1."""
+    weights = {}
+    for part in voice.split(","):
+        name, _, weight = part.strip().partition(":")
+        name = name.strip()
+        if not name:
+            raise ValueError(f"Empty voice name in mix {voice!r}")
+        try:
+            weight = float(weight) if weight.strip() else 1.0
+        except ValueError:
+            raise ValueError(f"Invalid weight for {name!r} in mix {voice!r}")
+        if not math.isfinite(weight):
+            raise ValueError(f"Non-finite weight for {name!r} in mix {voice!r}")
+        if weight < 0:
+            raise ValueError(f"Negative weight for {name!r} in mix {voice!r}")
+        weights[name] = weights.get(name, 0.0) + weight
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError(f"The weights of mix {voice!r} add up to 0")
+    return [(name, weights[name] / total) for name in sorted(weights) if weights[name] > 0]
+
+
+def normalize_voice(voice):
+    """The canonical name of a mix spec ("af_bella:0.7,af_heart:0.3"); stock voices are returned unchanged."""
+    if not is_mix(voice):
+        return voice
+    mix = parse_mix(voice)
+    if len(mix) == 1:
+        return mix[0][0]
+    return ",".join(f"{name}:{round(weight, 4):g}" for name, weight in mix)
+
+
+def mix_file(repo_id, voice):
+    digest = hashlib.sha256(f"{repo_id}\n{voice}".encode("utf-8")).hexdigest()
+    return os.path.join(VOICE_MIX_DIR, f"{digest[:32]}.npy")
+
+
+def blend(voice, load_pack, repo_id="hexgrad/Kokoro-82M"):
+    """The blended voice pack for a normalized mix spec.
+
+    load_pack(name) returns a stock voice pack, e.g. KPipeline.load_voice; it
+    is only called the first time the mix is seen on this host.
+    """
+    import torch
+    if voice in _blends:
+        return _blends[voice]
+    with _lock:
+        if voice not in _blends:
+            path = mix_file(repo_id, voice)
+            if not os.path.exists(path):
+                mix = parse_mix(voice)
+                pack = sum(weight * load_pack(name).float().cpu() for name, weight in mix)
+                os.makedirs(VOICE_MIX_DIR, exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.tmp"  # Other processes only ever see a complete file
+                with open(tmp_path, "wb") as f:
+                    np.save(f, pack.numpy())
+                os.replace(tmp_path, path)
+            _blends[voice] = map_voice(path) if MMAP_ENABLED else torch.from_numpy(np.load(path))
+    return _blends[voice]
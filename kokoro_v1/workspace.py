@@ -0,0 +1,36 @@
+"""Per-job working directories, so concurrent jobs never share a path."""
+import os
+import shutil
+
+WORKSPACE_ROOT = os.environ.get("KOKORO_WORKSPACE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "workspaces"))
+
+
+class Workspace:
+    """A directory that belongs to one job and is removed when the job ends.
+
+    Stages ask it for explicit paths instead of looking for "the newest file"
+    in a shared directory. Use it as a context manager, or call cleanup().
+    """
+
+    def __init__(self, job_id, root=WORKSPACE_ROOT):
+        self.job_id = job_id
+        self.dir = os.path.join(root, job_id)
+        os.makedirs(self.dir, exist_ok=True)
+
+    def path(self, name):
+        """Path of a file called name inside the workspace."""
+        return os.path.join(self.dir, name)
+
+    def keep(self, paths, dest_dir, prefix=""):
+        """Moves files out of the workspace into dest_dir (as prefix + name) so cleanup() leaves them; returns the new paths."""
+        os.makedirs(dest_dir, exist_ok=True)
+        return [shutil.move(path, os.path.join(dest_dir, prefix + os.path.basename(path))) for path in paths]
+
+    def cleanup(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.cleanup()